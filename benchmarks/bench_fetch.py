@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark of fetching data from Gerrit.
+
+Queries are answered by the local replay transport so paging, handling of
+the "moreChanges" flag and retries of the interrupted pages are measured
+without connecting to review.opendev.org. Fetch throughput is measured for
+different page latencies, error rates and numbers of fetch workers, and
+fetched data is checked to be the same in every case.
+
+Usage: python3 benchmarks/bench_fetch.py [--changes N] [--latency S,S]
+                                         [--error-rate R,R] [--workers N,N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+from rechecks_stats import gerrit
+from rechecks_stats import synthetic
+from rechecks_stats import transport
+
+
+def get_config(**kwargs):
+    config = argparse.Namespace(
+        newer_than='365', verbose=False, cache=False, refresh=False,
+        store=False, fetch_workers=1, parse_workers=1,
+        # Transport is replaced with the configured replay transport
+        transport='ssh', replay_file=None, branch='master', project=None)
+    for key, value in kwargs.items():
+        setattr(config, key, value)
+    return config
+
+
+def fetch(changes, page_size, latency, error_rate, workers, cache_dir):
+    config = get_config(fetch_workers=workers)
+    g = gerrit.Gerrit(config, status='merged')
+    g._cache_dir = cache_dir
+    g.transport = transport.ReplayTransport(
+        config, changes=changes, page_size=page_size, latency=latency,
+        error_rate=error_rate, seed=1)
+    start = time.time()
+    data = g._fetch_json_data()
+    return data, time.time() - start, g.transport
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark fetching data with the replay transport.')
+    parser.add_argument('--changes', type=int, default=10000,
+                        help='Number of changes. Default: 10000')
+    parser.add_argument('--page-size', type=int,
+                        default=transport.REPLAY_PAGE_SIZE,
+                        help='Number of changes in the page. Default: %s' %
+                             transport.REPLAY_PAGE_SIZE)
+    parser.add_argument('--latency', default='0,0.2',
+                        help='Comma separated latencies of the page, in '
+                             'seconds. Default: 0,0.2')
+    parser.add_argument('--error-rate', default='0,0.2',
+                        help='Comma separated probabilities that page is '
+                             'interrupted. Default: 0,0.2')
+    parser.add_argument('--retry-delay', type=float, default=0.01,
+                        help='Base delay of the retries of the interrupted '
+                             'pages, in seconds. Default: 0.01')
+    parser.add_argument('--workers', default='1,4',
+                        help='Comma separated numbers of fetch workers. '
+                             'Default: 1,4')
+    args = parser.parse_args()
+    gerrit.QUERY_RETRY_DELAY = args.retry_delay
+
+    changes = synthetic.DataGenerator(seed=0, days=365).get_changes(
+        args.changes)
+    expected = None
+    print("%8s %10s %7s %8s %8s %7s %12s" % (
+        'latency', 'error rate', 'workers', 'changes', 'pages', 'errors',
+        'changes/s'))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for latency in args.latency.split(','):
+            for error_rate in args.error_rate.split(','):
+                for workers in args.workers.split(','):
+                    data, duration, replay = fetch(
+                        changes, args.page_size, float(latency),
+                        float(error_rate), int(workers), cache_dir)
+                    ids = sorted(change['id'] for change in data)
+                    if expected is None:
+                        expected = ids
+                    elif ids != expected:
+                        print("Different changes fetched with latency %s, "
+                              "error rate %s and %s workers" % (
+                                  latency, error_rate, workers))
+                        sys.exit(1)
+                    print("%8s %10s %7s %8s %8s %7s %12.0f" % (
+                        latency, error_rate, workers, len(data),
+                        replay.queries, replay.errors, len(data) / duration))
+
+
+if __name__ == '__main__':
+    main()
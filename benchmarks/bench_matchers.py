@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark of the recheck comments matchers.
+
+Compares RecheckMatcher with the regular expressions used before to match
+recheck comments. It checks that both give the same results for all
+comments from the corpus and measures how long matching takes, including
+adversarial comments on which the regular expressions backtrack a lot.
+
+Usage: python3 benchmarks/bench_matchers.py [--size N] [--repeat N]
+"""
+
+import argparse
+import re
+import sys
+import timeit
+
+from rechecks_stats import matchers
+
+
+LEGACY_REGEXES = {
+    matchers.MATCH_ALL: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck",
+        flags=re.IGNORECASE),
+    matchers.MATCH_BARE: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck$",
+        flags=re.IGNORECASE),
+    matchers.MATCH_WITH_REASON: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck.+$",
+        flags=re.IGNORECASE),
+}
+
+TYPICAL_COMMENTS = [
+    "Patch Set 1: recheck",
+    "Patch Set 2:\n\nrecheck",
+    "Patch Set 3: Code-Review+1\n\nrecheck",
+    "Patch Set 3:\n\nrecheck bug 1234567 - timeout in "
+    "neutron-tempest-plugin-scenario-openvswitch",
+    "Patch Set 4: Workflow+1",
+    "Patch Set 5: Verified-1\n\nBuild failed (check pipeline).  For "
+    "information on how to proceed, see https://docs.opendev.org/",
+    "Patch Set 1:\n\n(2 comments)\n\nThanks for the patch, few nits inline.",
+    "Patch Set 7: Code-Review+2 Workflow+1",
+    "recheck",
+    "Patch Set 2: RECHECK",
+]
+
+
+def get_adversarial_comments(size):
+    return [
+        # Many spaces make the nested quantifier backtrack quadratically
+        "Patch Set 1:" + " " * size + "!",
+        " " * size + "\t!",
+        "Patch Set 1:" + "  " * (size // 2) + "recheck\n\nfoo\nbar",
+        # Long comments with many words which don't end with "recheck"
+        "Patch Set 1:" + " word" * (size // 5) + "\n\nnot a recheck!",
+        "Patch Set 1:" + " recheck" * (size // 8) + "\n\nlonger\ntext",
+    ]
+
+
+def check_results(comments):
+    mismatches = 0
+    for mode, regex in LEGACY_REGEXES.items():
+        matcher = matchers.RecheckMatcher(mode)
+        for comment in comments:
+            if bool(regex.search(comment)) != bool(matcher.search(comment)):
+                mismatches += 1
+                print("Different result in mode %s for comment: %r" % (
+                    mode, comment[:80]))
+    return mismatches
+
+
+def bench(name, comments, repeat):
+    print(name)
+    for mode, regex in LEGACY_REGEXES.items():
+        matcher = matchers.RecheckMatcher(mode)
+        regex_time = min(timeit.repeat(
+            lambda: [regex.search(c) for c in comments],
+            number=1, repeat=repeat))
+        matcher_time = min(timeit.repeat(
+            lambda: [matcher.search(c) for c in comments],
+            number=1, repeat=repeat))
+        print("  %-12s regex: %9.4fs  matcher: %9.4fs" % (
+            mode, regex_time, matcher_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark recheck comments matchers.')
+    parser.add_argument(
+        '--size', type=int, default=5000,
+        help='Length of the adversarial comments. Default: 5000')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of repetitions of each measurement. Default: 3')
+    args = parser.parse_args()
+
+    typical = TYPICAL_COMMENTS * 1000
+    adversarial = get_adversarial_comments(args.size)
+    if check_results(TYPICAL_COMMENTS + adversarial):
+        sys.exit(1)
+    bench("%s typical comments" % len(typical), typical, args.repeat)
+    bench("%s adversarial comments of ~%s characters" % (
+        len(adversarial), args.size), adversarial, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
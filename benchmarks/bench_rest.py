@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Benchmark of fetching data with the REST transport.
+
+Local stand-in of the Gerrit REST API serves "/changes/" pages of the
+synthetic changes, with configured latency of each page. It checks that
+changes fetched by the REST transport are converted to the same format as
+returned by "gerrit query" and measures how fetch throughput depends on the
+number of pages downloaded at the same time.
+
+Usage: python3 benchmarks/bench_rest.py [--changes N] [--latency S]
+                                        [--in-flight N,N]
+"""
+
+import argparse
+import gzip
+import http.server
+import json
+import sys
+import tempfile
+import threading
+import time
+from urllib import parse
+
+from rechecks_stats import gerrit
+from rechecks_stats import synthetic
+from rechecks_stats import transport
+
+
+def get_config(**kwargs):
+    config = argparse.Namespace(
+        newer_than='365', verbose=False, cache=False, refresh=False,
+        store=False, fetch_workers=1, parse_workers=1,
+        # Transport is replaced with the REST transport
+        transport='ssh', replay_file=None, gerrit_url=None,
+        branch='master', project=None)
+    for key, value in kwargs.items():
+        setattr(config, key, value)
+    return config
+
+
+def get_rest_time(timestamp):
+    return time.strftime(transport.REST_TIME_FORMAT + '.000000000',
+                         time.gmtime(timestamp))
+
+
+def get_rest_change(change, all_revisions):
+    """Convert change from the "gerrit query" format to the REST one."""
+    patch_sets = change['patchSets']
+    if not all_revisions:
+        patch_sets = patch_sets[-1:]
+    rest_change = {
+        'project': change['project'],
+        'branch': change['branch'],
+        'change_id': change['id'],
+        '_number': change['number'],
+        'subject': change['subject'],
+        'status': change['status'],
+        'owner': change['owner'],
+        'created': get_rest_time(change['createdOn']),
+        'updated': get_rest_time(change['lastUpdated']),
+        'current_revision': change['currentPatchSet']['revision'],
+        'revisions': {
+            ps['revision']: {'_number': ps['number'],
+                             'created': get_rest_time(ps['createdOn']),
+                             'uploader': ps['uploader']}
+            for ps in patch_sets},
+        'messages': [
+            {'date': get_rest_time(comment['timestamp']),
+             'author': comment['reviewer'],
+             'message': comment['message']}
+            for comment in change['comments']]}
+    for approval in change['currentPatchSet']['approvals']:
+        if approval['type'] == 'SUBM':
+            rest_change['submitted'] = get_rest_time(approval['grantedOn'])
+            rest_change['submitter'] = approval['by']
+    return rest_change
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Requests of the pages after the last one are cancelled by client
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super(StandInServer, self).handle_error(request, client_address)
+
+
+def get_handler(replay):
+
+    class GerritRestHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = parse.urlparse(self.path)
+            params = parse.parse_qs(url.query)
+            all_revisions = 'ALL_REVISIONS' in params.get('o', [])
+            records = list(replay.query(params['q'][0],
+                                        int(params['S'][0]), True))
+            if not records or records[-1].get('type') != 'stats':
+                # Page was interrupted
+                self.send_error(503)
+                return
+            stats = records.pop()
+            changes = records
+            rest_changes = [get_rest_change(change, all_revisions)
+                            for change in changes]
+            if rest_changes and stats['moreChanges']:
+                rest_changes[-1]['_more_changes'] = True
+            body = (transport.REST_MAGIC_PREFIX + '\n' +
+                    json.dumps(rest_changes)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return GerritRestHandler
+
+
+def get_comparable(change):
+    """Get fields of the projected change which REST API can return.
+
+    Comments made for the patch sets (e.g. inline ones) are not returned by
+    the "/changes/" endpoint and URL points to the stand-in server.
+    """
+    change = dict(change)
+    change['patchSets'] = [(ps['number'], ps['createdOn'])
+                           for ps in change['patchSets']]
+    change['currentPatchSet'] = {
+        'number': change['currentPatchSet']['number'],
+        'submitted': [approval['grantedOn'] for approval in
+                      change['currentPatchSet']['approvals'] if
+                      approval['type'] == 'SUBM']}
+    change.pop('url')
+    change['comments'] = [
+        (comment['timestamp'], comment['reviewer']['name'],
+         comment['message'])
+        for comment in change['comments']]
+    return change
+
+
+def fetch(_transport, cache_dir):
+    g = gerrit.Gerrit(_transport.config, status='merged',
+                      all_patch_sets=True)
+    g._cache_dir = cache_dir
+    g.transport = _transport
+    start = time.time()
+    data = g._fetch_json_data()
+    return data, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark fetching data with the REST transport.')
+    parser.add_argument('--changes', type=int, default=10000,
+                        help='Number of changes. Default: 10000')
+    parser.add_argument('--page-size', type=int, default=500,
+                        help='Number of changes in the page. Default: 500')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='Latency of the page, in seconds. Default: 0.2')
+    parser.add_argument('--in-flight', default='1,2,4,8',
+                        help='Comma separated numbers of pages downloaded at '
+                             'the same time. Default: 1,2,4,8')
+    args = parser.parse_args()
+
+    changes = synthetic.DataGenerator(seed=0, days=365).get_changes(
+        args.changes)
+    replay = transport.ReplayTransport(
+        get_config(), changes=changes, page_size=args.page_size,
+        latency=args.latency)
+    server = StandInServer(('127.0.0.1', 0), get_handler(replay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%s' % server.server_port
+
+    print("%9s %8s %12s" % ('in flight', 'changes', 'changes/s'))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data, _duration = fetch(transport.ReplayTransport(
+            get_config(), changes=changes), cache_dir)
+        expected = sorted((get_comparable(change) for change in data),
+                          key=lambda change: change['id'])
+        for in_flight in args.in_flight.split(','):
+            rest = transport.RestTransport(
+                get_config(), url, page_size=args.page_size,
+                max_in_flight=int(in_flight))
+            data, duration = fetch(rest, cache_dir)
+            rest.close()
+            fetched = sorted((get_comparable(change) for change in data),
+                             key=lambda change: change['id'])
+            if fetched != expected:
+                print("Fetched changes are different than served ones")
+                sys.exit(1)
+            print("%9s %8s %12.0f" % (in_flight, len(data),
+                                      len(data) / duration))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
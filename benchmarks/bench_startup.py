@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Startup time benchmark of the console scripts.
+
+Every console script defined in setup.cfg is started with "--help", which
+imports all modules needed by the script and parses config, and the best
+time of few runs is compared with the budget. Script exits with non-zero
+code if any of the console scripts is over its budget.
+
+Usage: python3 benchmarks/bench_startup.py [--budget SECONDS]
+           [--script-budget NAME=SECONDS ...] [--repeat N]
+"""
+
+import argparse
+import configparser
+import os
+import subprocess
+import sys
+import time
+
+
+SETUP_CFG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, 'setup.cfg')
+DEFAULT_BUDGET = 0.15  # seconds, on top of the bare interpreter startup
+
+
+def get_console_scripts():
+    setup_cfg = configparser.ConfigParser()
+    setup_cfg.read(SETUP_CFG)
+    console_scripts = {}
+    for line in setup_cfg['entry_points']['console_scripts'].splitlines():
+        if not line.strip():
+            continue
+        name, entry_point = [part.strip() for part in line.split('=')]
+        console_scripts[name] = entry_point.split(':')
+    return console_scripts
+
+
+def measure(code, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check startup time of the console scripts.')
+    parser.add_argument(
+        '--budget', type=float, default=DEFAULT_BUDGET,
+        help='Startup time budget (in seconds) for each script, not '
+             'counting the Python interpreter startup. Default: %s' %
+             DEFAULT_BUDGET)
+    parser.add_argument(
+        '--script-budget', action='append', default=[],
+        help='Budget for the single script, e.g. rechecks-stats=0.2. '
+             'Can be given many times.')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Number of runs of each script. Default: 5')
+    args = parser.parse_args()
+
+    budgets = {}
+    for script_budget in args.script_budget:
+        name, budget = script_budget.split('=')
+        budgets[name] = float(budget)
+
+    interpreter_time = measure('pass', args.repeat)
+    print("Python interpreter startup: %.3fs" % interpreter_time)
+    over_budget = False
+    for name, (module, function) in sorted(get_console_scripts().items()):
+        code = ("import sys; sys.argv = [%r, '--help']; "
+                "from %s import %s; %s()" % (name, module, function,
+                                             function))
+        startup_time = measure(code, args.repeat) - interpreter_time
+        budget = budgets.get(name, args.budget)
+        status = 'OK'
+        if startup_time > budget:
+            status = 'OVER BUDGET'
+            over_budget = True
+        print("%-20s %.3fs (budget %.3fs) %s" % (name, startup_time, budget,
+                                                 status))
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
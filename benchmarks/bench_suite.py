@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Benchmark suite of the data processing.
+
+Synthetic Gerrit data of several sizes is generated and time of each stage
+of processing is measured: projection of the fetched patches, cache write
+and load, points extraction, aggregation (per time window, project and
+team) and reports rendering.
+
+Usage: python3 benchmarks/bench_suite.py [--sizes 1000,10000] [--repeat N]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from rechecks_stats import data_parser
+from rechecks_stats import gerrit
+from rechecks_stats import printer
+from rechecks_stats import synthetic
+
+
+DEFAULT_SIZES = '1000,10000,50000'
+
+
+def get_config(**kwargs):
+    config = argparse.Namespace(
+        newer_than=None, verbose=False, cache=True, refresh=False,
+        store=False, fetch_workers=1, parse_workers=1, points_cache=False,
+        transport='ssh', replay_file=None, branch='master', project=None,
+        projects_file=None, time_window='week', rolling=None, rolling_step=1,
+        report_format='human', output=None, top=None)
+    for key, value in kwargs.items():
+        setattr(config, key, value)
+    return config
+
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def run_benchmarks(size, repeat, tmp_dir):
+    generator = synthetic.DataGenerator(seed=size)
+    raw_data = generator.get_changes(size)
+    # Patches are projected when they are fetched, before anything else
+    data = [gerrit.project_change(change) for change in raw_data]
+    projects_file = os.path.join(tmp_dir, 'projects.yaml')
+    with open(projects_file, 'w') as f:
+        # JSON is valid YAML
+        json.dump(generator.get_projects_file_data(), f)
+    config = get_config(projects_file=projects_file)
+
+    g = gerrit.Gerrit(config, all_patch_sets=True)
+    g._cache_dir = tmp_dir
+    avg_dp = data_parser.AvgDataParser(config, data)
+    bare_dp = data_parser.BareRechecksDataParser(config, data)
+    reasons_dp = data_parser.RechecksReasonsDataParser(config, data)
+    _printer = printer.get_printer(config)
+
+    def extract_avg_points():
+        avg_dp._points = None
+        avg_dp._points_table = None
+        return avg_dp.points
+
+    def extract_bare_points():
+        bare_dp._rechecks = None
+        bare_dp._cubes = {}
+        return bare_dp.get_bare_rechecks_stats_per_patch()
+
+    def extract_reasons_points():
+        return reasons_dp.get_rechecks_reasons()
+
+    def aggregate_bare_rechecks():
+        bare_dp._cubes = {}
+        return bare_dp.get_bare_rechecks_cube()
+
+    def aggregate_windows():
+        avg_dp._points_table = None
+        return avg_dp.get_all_avg_failures()
+
+    def render(func, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+
+    benchmarks = [
+        ('projection',
+         lambda: [gerrit.project_change(change) for change in raw_data]),
+        ('cache write', lambda: g._put_json_data_in_cache(data)),
+        ('cache load', g._get_json_data_from_cache),
+        ('points: build failures', extract_avg_points),
+        ('points: bare rechecks', extract_bare_points),
+        ('points: recheck reasons', extract_reasons_points),
+        ('aggregate: all time windows', aggregate_windows),
+        ('aggregate: bare rechecks all levels', aggregate_bare_rechecks),
+        ('report: patches rechecks',
+         lambda: render(_printer.print_patch_rechecks, avg_dp.points,
+                        avg_dp.get_avg_number_or_rechecks())),
+        ('report: bare rechecks per patch',
+         lambda: render(_printer.print_project_bare_rechecks,
+                        bare_dp.get_bare_rechecks_stats_per_patch())),
+        ('report: bare rechecks per project',
+         lambda: render(_printer.print_global_bare_rechecks,
+                        bare_dp.get_bare_rechecks_stats_per_project())),
+        ('report: recheck reasons',
+         lambda: render(_printer.print_reacheck_reasons,
+                        reasons_dp.get_rechecks_reasons())),
+    ]
+    print("%s changes" % size)
+    for name, func in benchmarks:
+        print("  %-36s %8.3fs" % (name, measure(func, repeat)))
+    print("  %-36s %8.1fMB" % (
+        'cache file size', os.path.getsize(g._get_cache_file()) / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark processing of the synthetic Gerrit data.')
+    parser.add_argument(
+        '--sizes', default=DEFAULT_SIZES,
+        help='Comma separated numbers of changes in the datasets. '
+             'Default: %s' % DEFAULT_SIZES)
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of repetitions of each measurement. Default: 3')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes.split(','):
+            run_benchmarks(int(size), args.repeat, tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,34 @@ from rechecks_stats import gerrit
 from rechecks_stats import printer
 
 
+LEVEL_TITLES = {'patch': 'Bare rechecks per patch',
+                'project': 'Bare rechecks per project',
+                'team': 'Bare rechecks per team',
+                'global': 'Bare rechecks in all patches'}
+
+
+def _get_levels(args):
+    if args.levels:
+        return [level.strip() for level in args.levels.split(',')]
+    if args.project:
+        return ['patch']
+    if args.stats_per_team:
+        return ['team']
+    return ['project']
+
+
 def main():
     args = config.get_bare_rechecks_parser()
     _printer = printer.get_printer(args)
+    levels = _get_levels(args)
 
-    if args.stats_per_team and not args.projects_file:
+    for level in levels:
+        if level not in data_parser.BARE_RECHECKS_LEVELS:
+            _printer.log_error(
+                "Unknown level %s of the stats. Possible levels: %s" % (
+                    level, ", ".join(data_parser.BARE_RECHECKS_LEVELS)))
+            sys.exit(1)
+    if ('team' in levels or args.team) and not args.projects_file:
         _printer.log_error(
             "Path to the projects.yaml file from the "
             "https://git.openstack.org/openstack/governance/ is required "
@@ -19,16 +42,18 @@ def main():
 
     g = gerrit.Gerrit(args, all_patch_sets=True)
 
-    data = g.get_json_data()
+    data = g.iter_json_data()
     dp = data_parser.BareRechecksDataParser(args, data)
+    if args.team and args.team not in dp.repos_to_teams_map.values():
+        _printer.log_error("Unknown team %s, it is not in the projects "
+                           "file %s" % (args.team, args.projects_file))
+        sys.exit(1)
+    cube = dp.get_bare_rechecks_cube(args.team)
 
-    if args.project:
-        _printer.print_project_bare_rechecks(
-            dp.get_bare_rechecks_stats_per_patch())
-    else:
-        if args.stats_per_team:
-            _printer.print_global_bare_rechecks(
-                dp.get_bare_rechecks_stats_per_team())
+    for level in levels:
+        if len(levels) > 1 and args.report_format == 'human':
+            _printer.print_msg(LEVEL_TITLES[level])
+        if level == 'patch':
+            _printer.print_project_bare_rechecks(cube['patch'])
         else:
-            _printer.print_global_bare_rechecks(
-                dp.get_bare_rechecks_stats_per_project())
+            _printer.print_global_bare_rechecks(cube[level])
@@ -4,6 +4,94 @@ import argparse
 rechecks_stats_parser = None
 bare_rechecks_parser = None
 rechecks_reasons_parser = None
+rechecks_service_parser = None
+
+
+def _add_fetch_arguments(parser):
+    parser.add_argument(
+        '--fetch-workers',
+        type=int,
+        default=1,
+        help='Number of concurrent Gerrit queries used to fetch data. '
+             'When it is greater than 1, query is split into disjoint date '
+             'ranges which are fetched in parallel. It requires '
+             '"--newer-than" to be set. Default: 1')
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Refresh cached results incrementally. Only patches updated '
+             'since the newest patch stored in the cache are downloaded '
+             'from Gerrit and merged with the cached ones. If there are no '
+             'cached results for the query yet, all data is downloaded.')
+    parser.add_argument(
+        '--store',
+        action='store_true',
+        help='Use local, indexed store of patches instead of the per query '
+             'cache. Queries for the project(s) and time range already '
+             'downloaded before, even by the different query, are answered '
+             'locally and only missing data is fetched from Gerrit. With '
+             '"--refresh" patches updated since the last fetch are '
+             'downloaded too.')
+    parser.add_argument(
+        '--transport',
+        default='ssh',
+        choices=['ssh', 'rest', 'replay'],
+        help='How Gerrit is queried. "ssh" (default) runs queries with the '
+             '"gerrit query" command over SSH. "rest" uses the REST API, '
+             'with several pages downloaded at the same time, it requires '
+             'the aiohttp package (the "rest" extra). "replay" '
+             'answers them locally with patches from the "--replay-file" '
+             '(or synthetic ones if it is not given). It is meant for '
+             'testing and benchmarks.')
+    parser.add_argument(
+        '--gerrit-url',
+        default=None,
+        help='URL of the Gerrit used by the "rest" transport. '
+             'Default: https://review.opendev.org')
+    parser.add_argument(
+        '--replay-file',
+        default=None,
+        help='JSON Lines file with patches used by the "replay" transport, '
+             'e.g. saved output of the "gerrit query --format=json" command '
+             'or file from the cache.')
+
+
+def _add_parse_arguments(parser):
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=1,
+        help='Number of processes used to parse data. When it is greater '
+             'than 1, data is split into chunks which are parsed in '
+             'parallel. Results are the same as when data is parsed by the '
+             'single process. Default: 1')
+    parser.add_argument(
+        '--points-cache',
+        action='store_true',
+        help='Keep comments matched in each patch in the cache, so next '
+             'runs parse again only patches which are new or were updated '
+             'since. Results are the same as without the cache.')
+
+
+def _add_output_arguments(parser):
+    parser.add_argument(
+        '--report-format',
+        default='human',
+        choices=['human', 'csv', 'jsonl'],
+        help='Format in which results will be printed. "human" (default) is '
+             'a table, "csv" and "jsonl" (JSON Lines, one object per row) '
+             'are written row by row, as soon as each row is ready.')
+    parser.add_argument(
+        '--output',
+        default=None,
+        help='Write results to this file instead of the standard output.')
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=None,
+        help='Print only that many rows with the highest values, e.g. '
+             'patches with the most rechecks. Only those rows are kept in '
+             'memory while results are sorted.')
 
 
 def get_rechecks_stats_parser():
@@ -25,8 +113,26 @@ def get_rechecks_stats_parser():
         rechecks_stats_parser.add_argument(
             '--time-window',
             default='week',
-            help='Count average number of recheck per "week" (default), '
-                 '"month" or "year".')
+            help='Count average number of recheck per "day", "week" '
+                 '(default), "month", "quarter" or "year".')
+        rechecks_stats_parser.add_argument(
+            '--rolling',
+            type=int,
+            default=None,
+            metavar='DAYS',
+            help='Count average number of rechecks in the rolling windows '
+                 'that many days long instead of the calendar time windows, '
+                 'e.g. 28 for the 4 weeks moving average. Windows end every '
+                 '"--rolling-step" days, the last one on the day of the '
+                 'newest patch. "--time-window" has no effect if this is '
+                 'set.')
+        rechecks_stats_parser.add_argument(
+            '--rolling-step',
+            type=int,
+            default=1,
+            metavar='DAYS',
+            help='Used together with "--rolling". Number of days between '
+                 'ends of the next rolling windows. Default: 1')
         rechecks_stats_parser.add_argument(
             '--all-patches',
             action='store_true',
@@ -52,12 +158,6 @@ def get_rechecks_stats_parser():
             '--plot',
             action='store_true',
             help='Generate graphs directly by script.')
-        rechecks_stats_parser.add_argument(
-            '--report-format',
-            default='human',
-            help=('Format in which results will be printed. '
-                  'Default value: "human" '
-                  'Possible values: "human", "csv"'))
         rechecks_stats_parser.add_argument(
             '--branch',
             default='master',
@@ -67,6 +167,25 @@ def get_rechecks_stats_parser():
             default=None,
             help='The OpenStack project to query. '
                  'For example openstack/neutron.')
+        rechecks_stats_parser.add_argument(
+            '--repos-file',
+            default=None,
+            help='Path to the file with list of the repositories, one per '
+                 'line. If this is given, data for all of them is fetched '
+                 'at once and average number of rechecks for each '
+                 'repository is returned. "--project", "--all-patches" '
+                 'and "--plot" have no effect in such case.')
+        rechecks_stats_parser.add_argument(
+            '--output-dir',
+            default=None,
+            help='Used together with "--repos-file". If this is set, stats '
+                 'for each repository are written to the separate file in '
+                 'this directory, named like <repository>_<newer-than> with '
+                 'the extension of the "--report-format" (.txt, .csv or '
+                 '.jsonl).')
+        _add_fetch_arguments(rechecks_stats_parser)
+        _add_parse_arguments(rechecks_stats_parser)
+        _add_output_arguments(rechecks_stats_parser)
 
     return rechecks_stats_parser.parse_args()
 
@@ -111,6 +230,24 @@ def get_bare_rechecks_parser():
                  'team instead of repository. Path to the projects.yaml file '
                  'from the OpenStack governance repository is required if '
                  'this option is set.')
+        bare_rechecks_parser.add_argument(
+            '--levels',
+            default=None,
+            help='Comma separated levels of the stats to print: "patch", '
+                 '"project", "team" and "global" (all patches together), '
+                 'e.g. "project,team,global". All of them are computed at '
+                 'once. Overrides levels selected by "--project" and '
+                 '"--stats-per-team".')
+        bare_rechecks_parser.add_argument(
+            '--team',
+            default=None,
+            help='Take into account only patches of the repositories of that '
+                 'OpenStack team. Path to the projects.yaml file from the '
+                 'OpenStack governance repository is required if this '
+                 'option is set.')
+        _add_fetch_arguments(bare_rechecks_parser)
+        _add_parse_arguments(bare_rechecks_parser)
+        _add_output_arguments(bare_rechecks_parser)
 
     return bare_rechecks_parser.parse_args()
 
@@ -142,4 +279,71 @@ def get_rechecks_reasons_parser():
             default=None,
             help='The OpenStack project to query. '
                  'For example openstack/neutron.')
-    return rechecks_reasons_parser.parse_args()
\ No newline at end of file
+        rechecks_reasons_parser.add_argument(
+            '--raw-reasons',
+            action='store_true',
+            help='Count comments exactly as they were written. By default '
+                 'reasons are normalized: "Patch Set N:" prefix, votes and '
+                 'redundant whitespaces are removed, links to the bugs and '
+                 'job names are replaced with placeholders, so the same '
+                 'reasons are grouped together.')
+        _add_fetch_arguments(rechecks_reasons_parser)
+        _add_parse_arguments(rechecks_reasons_parser)
+        _add_output_arguments(rechecks_reasons_parser)
+    return rechecks_reasons_parser.parse_args()
+
+
+def get_rechecks_service_parser():
+    global rechecks_service_parser
+    if rechecks_service_parser is None:
+        rechecks_service_parser = argparse.ArgumentParser(
+            description='Run service which keeps stats of the rechecks and '
+                        'bare rechecks in memory, refreshes them in the '
+                        'background and serves them as JSON over HTTP. '
+                        'Paths: /status, /rechecks (parameters: window, '
+                        'rolling, step, project, team), /rechecks/projects '
+                        '(team) and /bare-rechecks (project, team, '
+                        'by=patch|project|team|global).')
+        rechecks_service_parser.add_argument(
+            '--newer-than',
+            help='Only look at patches merged in the last so and so days.')
+        rechecks_service_parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Be more verbose.')
+        rechecks_service_parser.add_argument(
+            '--branch',
+            default='master',
+            help='Branch to check. For example stable/stein.')
+        rechecks_service_parser.add_argument(
+            '--project',
+            default=None,
+            help='The OpenStack project to query. '
+                 'For example openstack/neutron. Default: all projects')
+        rechecks_service_parser.add_argument(
+            '--projects-file',
+            default=None,
+            help='path to the projects.yaml file from the OpenStack '
+                 'governance repo. It is required for stats per team.')
+        rechecks_service_parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Address on which service listens. Default: 127.0.0.1')
+        rechecks_service_parser.add_argument(
+            '--port',
+            type=int,
+            default=8080,
+            help='Port on which service listens. Default: 8080')
+        rechecks_service_parser.add_argument(
+            '--refresh-interval',
+            type=int,
+            default=900,
+            help='Stats are refreshed every that many seconds, only patches '
+                 'updated since the last refresh are fetched from Gerrit. '
+                 'Default: 900')
+        _add_fetch_arguments(rechecks_service_parser)
+        _add_parse_arguments(rechecks_service_parser)
+        # Cached results are always used and refreshed by the service
+        rechecks_service_parser.set_defaults(cache=True, time_window='week',
+                                             report_format='human')
+    return rechecks_service_parser.parse_args()
\ No newline at end of file
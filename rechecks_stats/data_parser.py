@@ -1,31 +1,126 @@
-import collections
-import copy
-import datetime
+from concurrent import futures
+import contextlib
+import functools
+import itertools
 import re
 import sys
 import time
 
+from rechecks_stats import matchers
 from rechecks_stats import printer
+from rechecks_stats import reasons
+from rechecks_stats import teams
+
+
+# Levels of the bare rechecks stats, see
+# BareRechecksDataParser.get_bare_rechecks_cube()
+BARE_RECHECKS_LEVELS = ('patch', 'project', 'team', 'global')
+# Number of patches parsed by the worker process at once
+PARSE_CHUNK_SIZE = 500
+
+PATCH_SET_REGEX = re.compile(r"Patch Set (\d+)\:")
+# Patterns of the comments which are counted by the parsers
+BUILD_FAILED_REGEX = re.compile(r"Build failed \((check|gate) pipeline\)")
+ALL_RECHECKS_MATCHER = matchers.RecheckMatcher(matchers.MATCH_ALL)
+BARE_RECHECKS_MATCHER = matchers.RecheckMatcher(matchers.MATCH_BARE)
+RECHECKS_WITH_REASON_MATCHER = matchers.RecheckMatcher(
+    matchers.MATCH_WITH_REASON)
+
+
+class CommentPattern(object):
+    """Pattern which comments of the patches are matched against.
+
+    Matcher can be compiled regular expression or any other object with
+    search() method which returns true value for the matching comments.
+
+    Number of comments matching the pattern is stored in the point under the
+    name of the pattern. If authors are given, only comments made by one of
+    them are checked. If only_last_ps is set, only comments made for the last
+    patch set of the patch are checked. Messages of the matching comments are
+    stored in the point's "reasons" list if keep_reasons is set.
+    """
+
+    def __init__(self, name, matcher, authors=None, only_last_ps=False,
+                 keep_reasons=False):
+        self.name = name
+        self.matcher = matcher
+        self.authors = []
+        if authors:
+            self.authors = [author.lower() for author in authors]
+        self.only_last_ps = only_last_ps
+        self.keep_reasons = keep_reasons
+
+
+class Point(object):
+    """Stats of the single patch.
+
+    There can be a lot of points so they use __slots__ instead of dicts and
+    names of the counters are shared by all points created by the parser.
+    Values can be accessed as attributes or by keys, like in dict, e.g.
+    point['counter']. Reasons are stored only if the parser keeps them.
+    """
+
+    __slots__ = ('id', 'merged', 'project', 'url', 'subject', 'reasons',
+                 '_counter_names', '_counters')
+
+    def __init__(self, counter_names, counters, id, merged, project, url,
+                 subject, reasons=()):
+        self._counter_names = counter_names
+        self._counters = counters
+        self.id = id
+        self.merged = merged
+        self.project = project
+        self.url = url
+        self.subject = subject
+        self.reasons = reasons
+
+    def __getitem__(self, key):
+        try:
+            return self._counters[self._counter_names.index(key)]
+        except ValueError:
+            pass
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __getattr__(self, name):
+        # Only called if there is no such attribute, e.g. for counters.
+        # Private attributes may be not set yet, e.g. during unpickling.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._counters[self._counter_names.index(name)]
+        except ValueError:
+            raise AttributeError(name)
+
 
-import yaml
+class BareRechecksPoint(Point):
+
+    __slots__ = ()
+
+    @property
+    def bare_rechecks_percentage(self):
+        if self.all_rechecks != 0:
+            return (self.bare_rechecks / self.all_rechecks) * 100
+        return 0
 
 
 class DataParser(object):
 
     _points = None
+    _repos_to_teams_map = None
+    _patterns = ()
+    _point_class = Point
 
-    def __init__(self, config, data, check_only_last_ps, comment_authors=None):
+    def __init__(self, config, data, allow_no_points=False):
         self.printer = printer.get_printer(config)
         self.config = config
         self.data = data
-        self.check_only_last_ps = check_only_last_ps
+        self.allow_no_points = allow_no_points
         self.merge_timestamp_limit = time.time()
         if self.config.newer_than:
             self.merge_timestamp_limit = int(self.config.newer_than) * 86400
-        self.comment_authors = []
-        if comment_authors:
-            self.comment_authors = [
-                author.lower() for author in comment_authors]
 
     @property
     def points(self):
@@ -33,23 +128,21 @@ class DataParser(object):
             self._points = self._get_points()
         return self._points
 
-    def _load_repos_to_teams_list(self):
-        if not self.config.projects_file:
-            return None
-        with open(self.config.projects_file, "r") as projects_yaml:
+    @property
+    def repos_to_teams_map(self):
+        """Map of the repositories to the teams, if projects file is given.
+
+        It is loaded only when it is needed for the first time.
+        """
+        if self._repos_to_teams_map is None and self.config.projects_file:
             try:
-                projects = yaml.safe_load(projects_yaml)
-            except yaml.YAMLError as err:
+                self._repos_to_teams_map = teams.get_repos_to_teams_map(
+                    self.config.projects_file)
+            except ValueError as err:
                 self.printer.log_error("Error: %s while loading projects.yaml "
                                        "file." % err)
                 sys.exit(2)
-        repos_to_teams_map = {}
-        for project_name, project_data in projects.items():
-            for deliverable in project_data.get('deliverables', {}).values():
-                repos = deliverable.get('repos')
-                for repo in repos:
-                    repos_to_teams_map[repo] = project_name
-        return repos_to_teams_map
+        return self._repos_to_teams_map
 
     def _get_submission_timestamp(self, patch):
         try:
@@ -64,93 +157,215 @@ class DataParser(object):
             (approval['grantedOn'] for approval in approvals if
              approval['type'] == 'SUBM'), patch['lastUpdated'])
 
-    def _get_comments_from_patchsets(self, patchsets):
-        comments = []
-        for ps in patchsets:
-            for c in ps.get('comments', []):
-                if not c.get('timestamp'):
-                    c['timestamp'] = ps.get('createdOn')
-                comments.append(c)
-        return comments
-
-    def _get_points(self, regex=None, comments_newer_than=None):
-        points = []
-        regex = regex or self._regex
-        if self.check_only_last_ps:
-            ps_regex = re.compile(r"Patch Set (\d+)\:")
-
+    @staticmethod
+    def _iter_comments(patch):
+        """Yield all comments of the patch with their timestamps.
+
+        Comments made for the patch sets don't always have own timestamp, in
+        such case creation time of the patch set is used.
+        """
+        for comment in patch['comments']:
+            yield comment, comment.get('timestamp')
+        for ps in patch.get('patchSets', []):
+            for comment in ps.get('comments', []):
+                yield comment, comment.get('timestamp') or ps.get('createdOn')
+
+    def _get_patch_matches(self, patch, patterns,
+                           oldest_possible_comment=None):
+        """Get comments of the patch matching each of the patterns.
+
+        Every comment is checked against all patterns in a single pass.
+        Returned matches are list of timestamps of the matching comments for
+        each pattern and list of (timestamp, message) of the comments kept
+        as reasons. If oldest_possible_comment is not given, they don't
+        depend on the current time so they can be cached until patch is
+        updated.
+        """
+        if any(pattern.only_last_ps for pattern in patterns):
+            last_ps = int(patch['currentPatchSet']['number'])
+        timestamps = [[] for _pattern in patterns]
+        reasons = []
+        for comment, timestamp in self._iter_comments(patch):
+            if (oldest_possible_comment and
+                    timestamp and
+                    timestamp < oldest_possible_comment):
+                self.printer.log_debug(
+                    "Comment too old to be counted. Skipping.")
+                continue
+            msg = comment['message']
+            comment_author = None
+            comment_ps = None
+            for pattern_idx, pattern in enumerate(patterns):
+                if pattern.authors:
+                    if comment_author is None:
+                        comment_author = comment['reviewer']['name'].lower()
+                    if comment_author not in pattern.authors:
+                        continue
+                if pattern.only_last_ps:
+                    if comment_ps is None:
+                        re_ps = PATCH_SET_REGEX.search(msg)
+                        if re_ps:
+                            comment_ps = int(re_ps.group(1))
+                        else:
+                            self.printer.log_debug(
+                                "No patch set found for comment: %s" % msg)
+                            comment_ps = 0
+                    if comment_ps != last_ps:
+                        continue
+                if pattern.matcher.search(msg):
+                    timestamps[pattern_idx].append(timestamp)
+                    if pattern.keep_reasons:
+                        reasons.append((timestamp, msg))
+        return [timestamps, reasons]
+
+    def _get_patch_point(self, patch, patterns, counter_names, oldest_merge,
+                         oldest_possible_comment=None, matches=None):
+        """Get point with numbers of comments matching each of the patterns.
+
+        Comments are matched against the patterns unless matches of the
+        patch (e.g. cached ones) are given. Comments older than
+        oldest_possible_comment are not counted.
+        None is returned if patch was merged too long ago.
+        """
+        patch_merge_date = self._get_submission_timestamp(patch)
+        if patch_merge_date and (patch_merge_date < oldest_merge):
+            self.printer.log_debug("Patch %s too old to be counted. "
+                                   "Skipping." % patch['url'])
+            return None
+        if matches is None:
+            matches = self._get_patch_matches(patch, patterns,
+                                              oldest_possible_comment)
+        timestamps, reasons = matches
+        if oldest_possible_comment:
+            timestamps = [
+                [timestamp for timestamp in pattern_timestamps
+                 if not timestamp or timestamp >= oldest_possible_comment]
+                for pattern_timestamps in timestamps]
+            reasons = [
+                (timestamp, msg) for timestamp, msg in reasons
+                if not timestamp or timestamp >= oldest_possible_comment]
+        return self._point_class(
+            counter_names,
+            tuple(len(pattern_matches) for pattern_matches in timestamps),
+            patch['id'], patch_merge_date, sys.intern(patch['project']),
+            patch['url'], patch['subject'],
+            tuple(msg for _timestamp, msg in reasons))
+
+    def __getstate__(self):
+        # Parser is sent to the worker processes without data, which is
+        # sent to them in chunks.
+        state = self.__dict__.copy()
+        state['data'] = None
+        state.pop('_points', None)
+        return state
+
+    def _iter_chunks_points(self, patterns=None, comments_newer_than=None):
+        """Yield lists of points of the next chunks of patches.
+
+        Points are not sorted, they are in the same order as patches.
+        """
+        patterns = patterns or self._patterns
         now = time.time()
         oldest_merge = now - self.merge_timestamp_limit
+        oldest_possible_comment = None
         if comments_newer_than:
             oldest_possible_comment = now - int(comments_newer_than) * 86400
-        for patch in self.data:
-            patch_merge_date = self._get_submission_timestamp(patch)
-            if patch_merge_date and (patch_merge_date < oldest_merge):
-                self.printer.log_debug("Patch %s too old to be counted. "
-                                       "Skipping." % patch['url'])
-                continue
-            if self.check_only_last_ps:
-                last_ps = int(patch['currentPatchSet']['number'])
-            counter = 0
-            reasons = []
-            comments = copy.deepcopy(patch['comments'])
-            if 'patchSets' in patch.keys():
-                comments += self._get_comments_from_patchsets(
-                    patch['patchSets'])
-            for comment in comments:
-                if (comments_newer_than and
-                        comment.get('timestamp') and
-                        comment['timestamp'] < oldest_possible_comment):
-                    self.printer.log_debug(
-                        "Comment too old to be counted. Skipping.")
-                    continue
-                if self.comment_authors:
-                    comment_author = comment['reviewer']['name'].lower()
-                    if comment_author not in self.comment_authors:
-                        continue
-                msg = comment['message']
-                if self.check_only_last_ps:
-                    re_ps = re.search(ps_regex, msg)
-                    if not re_ps:
-                        self.printer.log_debug(
-                            "No patch set found for comment: %s" % msg)
-                        continue
-                    if int(re_ps.group(1)) != last_ps:
-                        self.printer.log_debug(
-                            "Comment was not for last patch set. Skipping")
-                        continue
-
-                if regex.search(msg):
-                    counter += 1
-                    reasons.append(msg)
-
-            points.append(
-                {'id': patch['id'],
-                 'merged': patch_merge_date,
-                 'counter': counter,
-                 'reasons': reasons,
-                 'project': patch['project'],
-                 'url': patch['url'],
-                 'subject': patch['subject']})
-        points = sorted(points, key=lambda i: i['merged'])
-
-        if not points:
+        get_points = functools.partial(
+            _get_chunk_points, self, patterns=patterns,
+            counter_names=tuple(pattern.name for pattern in patterns),
+            oldest_merge=oldest_merge,
+            oldest_possible_comment=oldest_possible_comment)
+
+        cache = None
+        if self.config.points_cache:
+            # Needed only with points cache
+            from rechecks_stats import points_cache
+            cache = points_cache.PointsCache(
+                points_cache.get_patterns_fingerprint(patterns))
+        data = iter(self.data)
+        chunks = iter(
+            lambda: list(itertools.islice(data, PARSE_CHUNK_SIZE)), [])
+        chunks = ((chunk, cache.get_matches(chunk) if cache else None)
+                  for chunk in chunks)
+
+        cached_patches = 0
+        with contextlib.ExitStack() as stack:
+            if self.config.parse_workers > 1:
+                executor = stack.enter_context(futures.ProcessPoolExecutor(
+                    max_workers=self.config.parse_workers))
+                # Results are returned in the order of chunks so points are
+                # exactly the same as when they are parsed by single process
+                results = executor.map(get_points, chunks)
+            else:
+                results = map(get_points, chunks)
+            for chunk_points, new_matches, chunk_cached_patches in results:
+                cached_patches += chunk_cached_patches
+                if new_matches:
+                    cache.put_matches(new_matches)
+                yield chunk_points
+        if cache:
+            cache.close()
+            self.printer.log_debug(
+                "Comments of %s patches found in the points cache" %
+                cached_patches)
+
+    def _ensure_points_found(self, found):
+        if not found and not self.allow_no_points:
             error = ('Could not parse points from data. It is likely that the '
                      'createdOn timestamp of the patches found is bogus.')
-            self.printer.print_error(error)
+            self.printer.log_error(error)
             sys.exit(1)
 
+    def _get_points(self, patterns=None, comments_newer_than=None):
+        points = []
+        for chunk_points in self._iter_chunks_points(patterns,
+                                                     comments_newer_than):
+            points += chunk_points
+        points = sorted(points, key=lambda i: i.merged)
+        self._ensure_points_found(points)
         return points
 
 
+def _get_chunk_points(parser, chunk_data, patterns, counter_names,
+                      oldest_merge, oldest_possible_comment):
+    """Get points of the chunk of patches.
+
+    Chunk data is tuple with list of patches and their cached matches (or
+    None if points cache is not used). Matches computed for patches which
+    were not cached are returned together with points.
+    """
+    chunk, cached_matches = chunk_data
+    if cached_matches is not None:
+        from rechecks_stats import points_cache
+    points = []
+    new_matches = {}
+    cached_patches = 0
+    for patch in chunk:
+        matches = None
+        if cached_matches is not None:
+            key = points_cache.get_patch_key(patch)
+            matches = cached_matches.get(key)
+            if matches is None:
+                matches = parser._get_patch_matches(patch, patterns)
+                new_matches[key] = (patch['lastUpdated'], matches)
+            else:
+                cached_patches += 1
+        point = parser._get_patch_point(
+            patch, patterns, counter_names, oldest_merge,
+            oldest_possible_comment, matches)
+        if point:
+            points.append(point)
+    return points, new_matches, cached_patches
+
+
 class AvgDataParser(DataParser):
 
-    def __init__(self, config, data):
-        super(AvgDataParser, self).__init__(config, data,
-                                            check_only_last_ps=True,
-                                            comment_authors=['zuul'])
-        self._avg_data_points = None
-        self._regex = re.compile(r"Build failed \((check|gate) pipeline\)")
+    def __init__(self, config, data, allow_no_points=False):
+        super(AvgDataParser, self).__init__(config, data, allow_no_points)
+        self._points_table = None
+        self._patterns = [
+            CommentPattern('counter', BUILD_FAILED_REGEX,
+                           authors=['zuul'], only_last_ps=True)]
 
     def get_avg_number_or_rechecks(self):
         build_failures = 0
@@ -158,219 +373,163 @@ class AvgDataParser(DataParser):
             build_failures += point['counter']
         return build_failures / len(self.points)
 
-    def get_avg_failures(self):
-        if self.config.time_window == 'week':
-            return self._get_avg_failures_per_week()
-        elif self.config.time_window == 'month':
-            return self._get_avg_failures_per_month()
-        else:
-            return self._get_avg_failures_per_year()
-
-    def _get_avg_failures_per_week(self):
-        if self._avg_data_points is None:
-            data = {}
-            for point in self.points:
-                point_date = datetime.date.fromtimestamp(point['merged'])
-                point_year, point_week, _ = point_date.isocalendar()
-                point_key = "%s-%s" % (point_year, point_week)
-                self.printer.log_debug("Patch %s merged %s (week %s)" % (
-                    point['id'], point_date, point_key))
-                if point_key not in data.keys():
-                    data[point_key] = [point['counter']]
-                else:
-                    data[point_key].append(point['counter'])
-
-            self._avg_data_points = {k: sum(v)/len(v) for k, v in data.items()}
-
-        return self._avg_data_points
-
-    def _get_avg_failures_per_month(self):
-        if self._avg_data_points is None:
-            data = {}
-            for point in self.points:
-                point_date = datetime.date.fromtimestamp(point['merged'])
-                point_key = "%s-%s" % (point_date.year, point_date.month)
-                self.printer.log_debug("Patch %s merged %s (week %s)" % (
-                    point['id'], point_date, point_key))
-                if point_key not in data.keys():
-                    data[point_key] = [point['counter']]
-                else:
-                    data[point_key].append(point['counter'])
-
-            self._avg_data_points = {k: sum(v)/len(v) for k, v in data.items()}
-
-        return self._avg_data_points
-
-    def _get_avg_failures_per_year(self):
-        if self._avg_data_points is None:
-            data = {}
-            for point in self.points:
-                point_date = datetime.date.fromtimestamp(point['merged'])
-                point_key = point_date.year
-                self.printer.log_debug("Patch %s merged %s (week %s)" % (
-                    point['id'], point_date, point_key))
-                if point_key not in data.keys():
-                    data[point_key] = [point['counter']]
-                else:
-                    data[point_key].append(point['counter'])
-
-            self._avg_data_points = {k: sum(v)/len(v) for k, v in data.items()}
-
-        return self._avg_data_points
+    @property
+    def points_table(self):
+        # NumPy is slow to import and not needed e.g. for --only-average
+        from rechecks_stats import points_table
+        if self._points_table is None:
+            self._points_table = points_table.PointsTable(self.points)
+        return self._points_table
+
+    def get_avg_failures(self, time_window=None, project=None):
+        from rechecks_stats import points_table
+        time_window = time_window or self.config.time_window
+        if time_window not in points_table.TIME_WINDOWS:
+            time_window = 'year'
+        return self.points_table.get_avg(time_window, project)
+
+    def get_rolling_avg_failures(self, days=None, step=None, project=None):
+        if days is None:
+            days = self.config.rolling
+        if step is None:
+            step = self.config.rolling_step
+        return self.points_table.get_rolling_avg(days, step, project)
+
+    def get_all_avg_failures(self, project=None):
+        from rechecks_stats import points_table
+        return {time_window: self.get_avg_failures(time_window, project)
+                for time_window in points_table.TIME_WINDOWS}
 
 
 class BareRechecksDataParser(DataParser):
 
-    def __init__(self, config, data):
+    _point_class = BareRechecksPoint
+
+    def __init__(self, config, data, allow_no_points=False):
         super(BareRechecksDataParser, self).__init__(config, data,
-                                                     check_only_last_ps=False)
+                                                     allow_no_points)
         self._avg_data_points = None
-        self._bare_rechecks_regex = re.compile(
-            r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck$",
-            flags=re.IGNORECASE)
-        self._all_rechecks_regex = re.compile(
-            r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck",
-            flags=re.IGNORECASE)
-        self._all_rechecks = None
-        self._bare_rechecks = None
-        self._repos_to_teams_map = self._load_repos_to_teams_list()
-
-    def _get_all_rechecks(self):
-        if not self._all_rechecks:
-            self._all_rechecks = {
-                r['id']: r for r in
-                self._get_points(
-                    regex=self._all_rechecks_regex,
-                    comments_newer_than=self.config.newer_than)}
-        return self._all_rechecks
-
-    def _get_bare_rechecks(self):
-        if not self._bare_rechecks:
-            self._bare_rechecks = {
-                r['id']: r for r in
-                self._get_points(
-                    regex=self._bare_rechecks_regex,
-                    comments_newer_than=self.config.newer_than)}
-        return self._bare_rechecks
+        self._patterns = [
+            CommentPattern('all_rechecks', ALL_RECHECKS_MATCHER),
+            CommentPattern('bare_rechecks', BARE_RECHECKS_MATCHER)]
+        self._rechecks = None
+        self._cubes = {}
 
-    def get_bare_rechecks_stats_per_patch(self):
-        all_rechecks = self._get_all_rechecks()
-        bare_rechecks = self._get_bare_rechecks()
-        rechecks_stats = []
-        for patch_id, stats in all_rechecks.items():
-            p_stats = stats.copy()
-            p_stats['bare_rechecks'] = bare_rechecks[patch_id]['counter']
-            p_stats['all_rechecks'] = all_rechecks[patch_id]['counter']
-            if p_stats['all_rechecks'] != 0:
-                p_stats['bare_rechecks_percentage'] = (
-                    p_stats['bare_rechecks'] / p_stats['all_rechecks']) * 100
-            else:
-                p_stats['bare_rechecks_percentage'] = 0
-            rechecks_stats.append(p_stats)
-        return rechecks_stats
+    def _get_rechecks(self):
+        if not self._rechecks:
+            self._rechecks = {
+                r['id']: r for r in
+                self._get_points(comments_newer_than=self.config.newer_than)}
+        return self._rechecks
 
-    def get_bare_rechecks_stats_per_project(self):
-        all_rechecks = self._get_all_rechecks()
-        bare_rechecks = self._get_bare_rechecks()
-        rechecks_stats = {}
-        for patch_id in all_rechecks.keys():
-            patch_stats = all_rechecks[patch_id]
+    def get_bare_rechecks_cube(self, team=None):
+        """Get stats of the bare rechecks on all levels at once.
+
+        Returned dict has lists of the stats per "patch" (the points),
+        "project", "team" and the "global" one, all computed in the single
+        pass over the points. Stats per project and per team are sorted by
+        the percentage of bare rechecks, there are no stats per team if the
+        projects file is not given. If team is given, only patches of that
+        team's projects are taken into account.
+        """
+        if team in self._cubes:
+            return self._cubes[team]
+        repos_to_teams_map = self.repos_to_teams_map or {}
+        patches = []
+        projects_stats = {}
+        teams_stats = {}
+        global_stats = {'all_rechecks': 0, 'bare_rechecks': 0}
+        for patch_id, patch_stats in self._get_rechecks().items():
             project = patch_stats['project']
-            if project not in rechecks_stats:
-                rechecks_stats[project] = {
-                    'project': project,
-                    'all_rechecks': all_rechecks[patch_id]['counter'],
-                    'bare_rechecks': bare_rechecks[patch_id]['counter']}
-            else:
-                rechecks_stats[project]['all_rechecks'] += (
-                        all_rechecks[patch_id]['counter'])
-                rechecks_stats[project]['bare_rechecks'] += (
-                        bare_rechecks[patch_id]['counter'])
-
-            if self._repos_to_teams_map:
-                rechecks_stats[project]['team'] = (
-                    self._repos_to_teams_map.get(project))
-
-        for project in rechecks_stats.keys():
-            if rechecks_stats[project]['all_rechecks'] != 0:
-                rechecks_stats[project]['bare_rechecks_percentage'] = (
-                    rechecks_stats[project]['bare_rechecks'] /
-                    rechecks_stats[project]['all_rechecks']) * 100
+            patch_team = repos_to_teams_map.get(project)
+            if team is not None and patch_team != team:
+                continue
+            patches.append(patch_stats)
+            project_stats = projects_stats.get(project)
+            if project_stats is None:
+                project_stats = projects_stats[project] = {
+                    'project': project, 'all_rechecks': 0,
+                    'bare_rechecks': 0}
+                if repos_to_teams_map:
+                    project_stats['team'] = patch_team
+            levels_stats = [project_stats, global_stats]
+            if patch_team:
+                if patch_team not in teams_stats:
+                    teams_stats[patch_team] = {
+                        'team': patch_team, 'all_rechecks': 0,
+                        'bare_rechecks': 0}
+                levels_stats.append(teams_stats[patch_team])
+            elif repos_to_teams_map:
+                self.printer.log_debug("Patch %s don't have team associated. "
+                                       "Skipping it in stats per team." %
+                                       patch_id)
+            for stats in levels_stats:
+                stats['all_rechecks'] += patch_stats['all_rechecks']
+                stats['bare_rechecks'] += patch_stats['bare_rechecks']
+
+        for stats in itertools.chain(projects_stats.values(),
+                                     teams_stats.values(), [global_stats]):
+            if stats['all_rechecks'] != 0:
+                stats['bare_rechecks_percentage'] = (
+                    stats['bare_rechecks'] / stats['all_rechecks']) * 100
             else:
-                rechecks_stats[project]['bare_rechecks_percentage'] = 0
+                stats['bare_rechecks_percentage'] = 0
+
+        self._cubes[team] = {
+            'patch': patches,
+            'project': sorted(projects_stats.values(),
+                              key=lambda i: i['bare_rechecks_percentage'],
+                              reverse=True),
+            'team': sorted(teams_stats.values(),
+                           key=lambda i: i['bare_rechecks_percentage'],
+                           reverse=True),
+            'global': [global_stats]}
+        return self._cubes[team]
 
-        return sorted(
-            rechecks_stats.values(),
-            key=lambda i: i['bare_rechecks_percentage'],
-            reverse=True)
+    def get_bare_rechecks_stats_per_patch(self):
+        return self.get_bare_rechecks_cube()['patch']
 
-    def get_bare_rechecks_stats_per_team(self):
-        # TODO: this has to be implemented still
-        all_rechecks = self._get_all_rechecks()
-        bare_rechecks = self._get_bare_rechecks()
-        rechecks_stats = {}
-        for patch_id in all_rechecks.keys():
-            patch_stats = all_rechecks[patch_id]
-            project = patch_stats['project']
-            team = self._repos_to_teams_map.get(project)
-            if not team:
-                self.printer.log_debug("Patch %s don't have team associated. "
-                                       "Skipping." % patch_id)
-                continue
-            if team not in rechecks_stats:
-                rechecks_stats[team] = {
-                    'team': team,
-                    'all_rechecks': all_rechecks[patch_id]['counter'],
-                    'bare_rechecks': bare_rechecks[patch_id]['counter']}
-            else:
-                rechecks_stats[team]['all_rechecks'] += (
-                        all_rechecks[patch_id]['counter'])
-                rechecks_stats[team]['bare_rechecks'] += (
-                        bare_rechecks[patch_id]['counter'])
-
-        for team in rechecks_stats.keys():
-            if rechecks_stats[team]['all_rechecks'] != 0:
-                rechecks_stats[team]['bare_rechecks_percentage'] = (
-                    rechecks_stats[team]['bare_rechecks'] /
-                    rechecks_stats[team]['all_rechecks']) * 100
-            else:
-                rechecks_stats[team]['bare_rechecks_percentage'] = 0
+    def get_bare_rechecks_stats_per_project(self):
+        return self.get_bare_rechecks_cube()['project']
 
-        return sorted(
-            rechecks_stats.values(),
-            key=lambda i: i['bare_rechecks_percentage'],
-            reverse=True)
+    def get_bare_rechecks_stats_per_team(self):
+        return self.get_bare_rechecks_cube()['team']
 
 
 class RechecksReasonsDataParser(DataParser):
 
     def __init__(self, config, data):
-        super(RechecksReasonsDataParser, self).__init__(
-            config, data, check_only_last_ps=False)
-
-        self._rechecks_regex = re.compile(
-            r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck.+$",
-            flags=re.IGNORECASE)
-        self._rechecks = None
-
-    def _get_rechecks(self):
-        if not self._rechecks:
-            self._rechecks = {
-                r['id']: r for r in
-                self._get_points(
-                    regex=self._rechecks_regex,
-                    comments_newer_than=self.config.newer_than)}
-        return self._rechecks
+        super(RechecksReasonsDataParser, self).__init__(config, data)
+        self._patterns = [
+            CommentPattern('counter', RECHECKS_WITH_REASON_MATCHER,
+                           keep_reasons=True)]
 
     def get_rechecks_reasons(self):
-        rechecks = self._get_rechecks()
-        all_reasons = collections.defaultdict(int)
-        for patch_id in rechecks.keys():
-            patch_stats = rechecks[patch_id]
-            if patch_stats['reasons']:
-                for reason in patch_stats['reasons']:
-                    all_reasons[reason] += 1
-        return dict(
-            sorted(all_reasons.items(),
-                   key=lambda i:i[1],
-                   reverse=True))
\ No newline at end of file
+        """Get the most frequent reasons of the rechecks and their counts.
+
+        Unless "--raw-reasons" is set, reasons are normalized first so the
+        same reasons are grouped. They are counted by the sketch of fixed
+        size so counts may be overestimated if there are more distinct
+        reasons than the sketch can keep, see reasons.SpaceSaving.
+        Reasons are counted as soon as each chunk of patches is parsed and
+        points are not kept, so memory used doesn't depend on the number of
+        patches and comments.
+        """
+        top = getattr(self.config, 'top', None)
+        sketch_size = reasons.REASONS_SKETCH_SIZE
+        if top:
+            sketch_size = max(sketch_size,
+                              top * reasons.REASONS_SKETCH_SIZE_PER_TOP)
+        sketch = reasons.SpaceSaving(sketch_size)
+        raw_reasons = getattr(self.config, 'raw_reasons', False)
+        points_found = False
+        for chunk_points in self._iter_chunks_points(
+                comments_newer_than=self.config.newer_than):
+            points_found = points_found or bool(chunk_points)
+            for point in chunk_points:
+                for reason in point['reasons']:
+                    if not raw_reasons:
+                        reason = reasons.normalize_reason(reason)
+                    sketch.add(reason)
+        self._ensure_points_found(points_found)
+        return dict(sketch.top(top))
@@ -1,14 +1,103 @@
+from concurrent import futures
+import datetime
+import fcntl
+import gzip
+import hashlib
 import json
 import os
-import subprocess
+import random
+import shlex
 import sys
+import time
 from pathlib import Path
 
 from rechecks_stats import printer
+from rechecks_stats import store
+from rechecks_stats import transport
 
 
 CACHE_DIR_NAME = ".rechecks_cache"
-MAX_SSH_ERRORS = 10
+CACHE_FILE_SUFFIX = ".jsonl.gz"
+CACHE_FORMAT_VERSION = 1
+CACHE_COMPRESS_LEVEL = 6
+MAX_CACHE_FILE_NAME_LENGTH = 200
+# Maximum number of projects queried with the single Gerrit query
+MAX_PROJECTS_PER_QUERY = 50
+# Maximum number of the query errors in a row, without any patch received
+MAX_QUERY_ERRORS = 10
+# Failed query is retried after random delay (in seconds) from 0 to
+# QUERY_RETRY_DELAY * 2^n, where n is number of errors in a row, but not
+# more than QUERY_MAX_RETRY_DELAY.
+QUERY_RETRY_DELAY = 1
+QUERY_MAX_RETRY_DELAY = 120
+# Patches fetched by the query are stored in the partial results file, page
+# by page, until whole query is done. Interrupted query is resumed from the
+# last stored page, if it was interrupted less than PARTIAL_MAX_AGE seconds
+# ago. After that time queries with relative age match different patches.
+# File is locked by the process running the query, other processes running
+# the same query at the same time fetch all patches again, without the file.
+PARTIAL_FILE_SUFFIX = ".partial.jsonl"
+PARTIAL_FORMAT_VERSION = 1
+PARTIAL_MAX_AGE = 86400
+# Only fields used by the parsers are kept in the fetched patches. Version
+# has to be increased every time when new field is needed, so data stored
+# before is not used anymore.
+PROJECTION_VERSION = 1
+PROJECTED_FIELDS = ('id', 'project', 'branch', 'status', 'url', 'subject',
+                    'createdOn', 'lastUpdated')
+# Number of date shards created for each fetch worker. Changes are not spread
+# evenly in time so having more shards than workers helps to balance load.
+SHARDS_PER_WORKER = 2
+# Changes updated that many days before the newest change already stored in
+# the cache are fetched again during refresh. It protects against time zone
+# differences and changes which were updated while the cache was written.
+REFRESH_OVERLAP_DAYS = 1
+
+
+def _project_comment(comment):
+    projected = {'message': comment['message']}
+    if 'timestamp' in comment:
+        projected['timestamp'] = comment['timestamp']
+    if 'reviewer' in comment:
+        projected['reviewer'] = {
+            key: comment['reviewer'][key] for key in ('name', )
+            if key in comment['reviewer']}
+    return projected
+
+
+def project_change(change):
+    """Get copy of the change with only fields used by the parsers.
+
+    Those are basic data of the change, number of the current patch set,
+    its submission time and all comments (also ones made for the patch
+    sets, if patch sets are fetched).
+    """
+    projected = {key: change[key] for key in PROJECTED_FIELDS
+                 if key in change}
+    if 'currentPatchSet' in change:
+        current_patch_set = change['currentPatchSet']
+        projected['currentPatchSet'] = {
+            'number': current_patch_set.get('number')}
+        if 'approvals' in current_patch_set:
+            projected['currentPatchSet']['approvals'] = [
+                {'type': approval['type'],
+                 'grantedOn': approval['grantedOn']}
+                for approval in current_patch_set['approvals']
+                if approval['type'] == 'SUBM']
+    projected['comments'] = [_project_comment(comment)
+                             for comment in change.get('comments', [])]
+    if 'patchSets' in change:
+        projected['patchSets'] = []
+        for patch_set in change['patchSets']:
+            projected_patch_set = {
+                key: patch_set[key] for key in ('number', 'createdOn')
+                if key in patch_set}
+            if 'comments' in patch_set:
+                projected_patch_set['comments'] = [
+                    _project_comment(comment)
+                    for comment in patch_set['comments']]
+            projected['patchSets'].append(projected_patch_set)
+    return projected
 
 
 # Script based on Assaf Muller's script
@@ -17,107 +106,546 @@ MAX_SSH_ERRORS = 10
 
 class Gerrit(object):
 
-    def __init__(self, config, status=None, all_patch_sets=False):
+    def __init__(self, config, status=None, all_patch_sets=False,
+                 projects=None, allow_empty=False):
         self.config = config
         self.status = status
+        # Empty list of projects means all projects
+        if projects is None:
+            projects = [config.project] if config.project else []
+        self.projects = projects
+        self.allow_empty = allow_empty
         self.all_patch_sets = all_patch_sets
+        # Local store keeps all patch sets data so it can answer all queries
+        self._fetch_patch_sets = all_patch_sets or config.store
         self.printer = printer.get_printer(config)
         self._build_query(config)
         self._cache_dir = "%s/%s" % (Path.home(), CACHE_DIR_NAME)
+        self._ssh_control_path = "%s/ssh-%%r@%%h:%%p" % self._cache_dir
+        self.transport = transport.get_transport(config,
+                                                 self._ssh_control_path)
 
     def _build_query(self, config):
-        self.query = "branch:%s " % config.branch
+        self._base_query = "branch:%s " % config.branch
         if self.status:
-            self.query += 'status:%s ' % self.status
-        if config.project:
-            self.query += 'project:%s ' % config.project
+            self._base_query += 'status:%s ' % self.status
+        if len(self.projects) == 1:
+            self._base_query += 'project:%s ' % self.projects[0]
+        elif self.projects:
+            self._base_query += '%s ' % shlex.quote(
+                '(%s)' % ' OR '.join(
+                    'project:%s' % project for project in self.projects))
+        self.query = self._base_query
         if config.newer_than:
             self.query += ' -- -age:%dd' % int(config.newer_than)
         self.printer.log_debug("Query: %s" % self.query)
 
+    def _get_age_range_query(self, newer_than, older_than=None):
+        """Get query for changes updated between given number of days ago.
+
+        Changes updated less than newer_than days ago (if newer_than is given)
+        and more than older_than days ago (if older_than is given) are
+        matched by such query.
+        """
+        query = self._base_query + ' --'
+        if newer_than:
+            query += ' -age:%dd' % newer_than
+        if older_than:
+            query += ' age:%dd' % older_than
+        return query
+
+    @staticmethod
+    def _get_updated_since_query(query, timestamp):
+        since = (datetime.datetime.utcfromtimestamp(timestamp) -
+                 datetime.timedelta(days=REFRESH_OVERLAP_DAYS))
+        return '%s after:%s' % (query, since.strftime('%Y-%m-%d'))
+
+    def _get_sharded_queries(self):
+        if not self.config.newer_than:
+            self.printer.log_debug(
+                "Query can't be split into date shards without "
+                "--newer-than. Data will be fetched sequentially.")
+            return [self.query]
+        days = int(self.config.newer_than)
+        shards_number = min(
+            days, self.config.fetch_workers * SHARDS_PER_WORKER)
+        queries = []
+        for shard in range(shards_number):
+            older_than = days * shard // shards_number
+            newer_than = days * (shard + 1) // shards_number
+            queries.append(self._get_age_range_query(newer_than, older_than))
+        return queries
+
     def _ensure_cache_dir_exists(self):
         try:
             os.mkdir(self._cache_dir)
         except OSError:
             pass
 
-    def _get_file_from_query(self):
-        return self.query.replace('/', '_')
+    def _get_file_from_query(self, query=None):
+        query = query or self.query
+        if len(query) > MAX_CACHE_FILE_NAME_LENGTH:
+            # Queries for many projects are too long to be used as file name
+            return hashlib.sha1(query.encode('utf-8')).hexdigest()
+        return query.replace('/', '_')
+
+    def _ensure_patches_found(self, found):
+        if not found and not self.allow_empty:
+            self.printer.log_error('No patches found!')
+            sys.exit(1)
+
+    def _get_cache_file(self):
+        return '%s/%s%s' % (self._cache_dir, self._get_file_from_query(),
+                            CACHE_FILE_SUFFIX)
+
+    def _migrate_legacy_cache(self):
+        # Caches written by older versions are single, not compressed JSON
+        # lists stored in files named exactly like the query.
+        legacy_cache_file = '%s/%s' % (self._cache_dir,
+                                       self._get_file_from_query())
+        if not os.path.isfile(legacy_cache_file):
+            return
+        self.printer.log_debug("Converting cache file %s to the new format" %
+                               legacy_cache_file)
+        with open(legacy_cache_file) as f:
+            self._put_json_data_in_cache(json.load(f))
+        os.remove(legacy_cache_file)
+
+    def _iter_json_data_from_cache(self):
+        """Yield patches stored in the cache one by one.
+
+        Cache file is a gzip compressed JSON Lines file. First line is a
+        header with format version, each of the next lines is a single patch.
+        """
+        self._ensure_cache_dir_exists()
+        cache_file = self._get_cache_file()
+        if not os.path.exists(cache_file):
+            self._migrate_legacy_cache()
+            if not os.path.exists(cache_file):
+                return
+        with gzip.open(cache_file, 'rt') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != CACHE_FORMAT_VERSION:
+                self.printer.log_debug(
+                    "Unsupported cache format version %s in %s. "
+                    "Ignoring it." % (header.get('version'), cache_file))
+                return
+            # Caches without projection version have complete patches
+            if header.get('projection') not in (None, PROJECTION_VERSION):
+                self.printer.log_debug(
+                    "Cache %s has different fields of patches than needed. "
+                    "Ignoring it." % cache_file)
+                return
+            for line in f:
+                yield json.loads(line)
 
     def _get_json_data_from_cache(self):
+        return list(self._iter_json_data_from_cache())
+
+    def _get_cache_metadata(self):
         self._ensure_cache_dir_exists()
-        query_file_name = self._get_file_from_query()
-        if query_file_name in os.listdir(self._cache_dir):
-            with open('%s/%s' % (self._cache_dir, query_file_name)) as f:
+        meta_file_name = '%s.meta' % self._get_file_from_query()
+        if meta_file_name in os.listdir(self._cache_dir):
+            with open('%s/%s' % (self._cache_dir, meta_file_name)) as f:
                 return json.load(f)
+        return {}
 
-    def _put_json_data_in_cache(self, data):
+    def _iter_json_data_into_cache(self, data):
+        """Write data to the cache while passing it through.
+
+        Cache file is replaced only when all data was written so cache is
+        never left with partial results.
+        """
         self._ensure_cache_dir_exists()
-        query_file_name = self._get_file_from_query()
-        with open('%s/%s' % (self._cache_dir, query_file_name), 'w') as f:
-            json.dump(data, f)
+        cache_file = self._get_cache_file()
+        last_updated = None
+        count = 0
+        with gzip.open('%s.tmp' % cache_file, 'wt',
+                       compresslevel=CACHE_COMPRESS_LEVEL) as f:
+            f.write(json.dumps({'version': CACHE_FORMAT_VERSION,
+                                'projection': PROJECTION_VERSION,
+                                'query': self.query}) + '\n')
+            for change in data:
+                f.write(json.dumps(change) + '\n')
+                count += 1
+                if (last_updated is None or
+                        change['lastUpdated'] > last_updated):
+                    last_updated = change['lastUpdated']
+                yield change
+        os.replace('%s.tmp' % cache_file, cache_file)
+        meta_file = '%s/%s.meta' % (self._cache_dir,
+                                    self._get_file_from_query())
+        with open(meta_file, 'w') as f:
+            json.dump({'last_updated': last_updated, 'count': count}, f)
 
-    def _exec_cmd(self, command):
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE, shell=True)
-        output, error = process.communicate()
+    def _put_json_data_in_cache(self, data):
+        for _change in self._iter_json_data_into_cache(data):
+            pass
 
-        return output, error
+    def _get_partial_file(self, query):
+        return '%s/%s%s' % (self._cache_dir, self._get_file_from_query(query),
+                            PARTIAL_FILE_SUFFIX)
 
-    def _get_json_data_from_query(self):
-        data = []
-        start = 0
-        ssh_errors = 0
+    @staticmethod
+    def _open_partial_file(partial_file):
+        """Open partial results file, locked for the query run by this one.
 
-        while True:
-            gerrit_cmd = (
-                'ssh -p 29418 review.opendev.org gerrit query --format=json '
-                '--current-patch-set --comments ')
-            if self.all_patch_sets:
-                gerrit_cmd += '--patch-sets '
+        None is returned if file is locked by the other process (or thread)
+        which runs the same query at the same time.
+        """
+        f = open(partial_file, 'a+b')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # File could be removed by the process which held the lock
+            # before, then it's not the partial results file anymore
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(partial_file)):
+                return f
+        except OSError:
+            pass
+        f.close()
+        return None
 
-            gerrit_cmd += '--start %(start)s %(query)s' % {'start': start,
-                                                           'query': self.query}
-            result, error = self._exec_cmd(gerrit_cmd)
+    @staticmethod
+    def _remove_partial_file(partial_file):
+        try:
+            os.remove(partial_file)
+        except FileNotFoundError:
+            pass
 
-            if error:
-                if ssh_errors < MAX_SSH_ERRORS:
-                    ssh_errors += 1
+    @staticmethod
+    def _write_partial_record(partial, record):
+        partial.write(json.dumps(record).encode('utf-8') + b'\n')
+
+    def _write_partial_header(self, partial, query):
+        partial.truncate(0)
+        self._write_partial_record(partial, {
+            'version': PARTIAL_FORMAT_VERSION,
+            'projection': PROJECTION_VERSION, 'query': query,
+            'patch_sets': self._fetch_patch_sets,
+            'created': int(time.time())})
+
+    def _load_partial_results(self, partial, query):
+        """Get patches fetched before by the interrupted query.
+
+        Partial results file is a JSON Lines file with header in the first
+        line and patches of each page followed by the checkpoint. Only pages
+        with checkpoint are taken and file is truncated after the last
+        checkpoint, so next pages can be appended to it.
+        Returns tuple with the time when query was started, number of
+        patches fetched so far (which is where the query is resumed from)
+        and list of those patches, without duplicates. None is returned if
+        there are no partial results for the query.
+        """
+        partial.seek(0)
+        try:
+            header = json.loads(partial.readline())
+        except ValueError:
+            header = {}
+        if (header.get('version') != PARTIAL_FORMAT_VERSION or
+                header.get('projection') != PROJECTION_VERSION or
+                header.get('query') != query or
+                header.get('patch_sets') != self._fetch_patch_sets or
+                header.get('created', 0) < time.time() - PARTIAL_MAX_AGE):
+            return None
+        changes = {}
+        fetched = 0
+        page = []
+        checkpoint = partial.tell()
+        for line in partial:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Script was stopped while line was written
+                break
+            if record.get('type') == 'checkpoint':
+                # Patches updated while the query was run can move between
+                # pages so the same patch can be fetched again. The last
+                # fetched version is the newest one.
+                for change in page:
+                    changes[change['id']] = change
+                fetched += len(page)
+                page = []
+                checkpoint = partial.tell()
+            else:
+                page.append(record)
+        partial.truncate(checkpoint)
+        return header['created'], fetched, list(changes.values())
+
+    def _get_retry_delay(self, query_errors):
+        # Exponential backoff with full jitter, so many clients (e.g. fetch
+        # workers) don't retry at the same time.
+        return random.uniform(0, min(QUERY_MAX_RETRY_DELAY,
+                                     QUERY_RETRY_DELAY * 2 ** query_errors))
+
+    def _iter_json_data_from_query(self, query):
+        """Yield patches matched by the query, fetched page by page.
+
+        Every page is stored in the partial results file as soon as it is
+        received, so if the script is stopped, next run of the same query
+        resumes from the first missing page. Patches updated since the
+        interrupted query was started could move to the pages fetched
+        before, so they are fetched again then and resumed query's patches
+        are yielded only when all of them are known.
+        If the same query is run by the other process at the same time, all
+        patches are fetched again, without the partial results file.
+        """
+        self._ensure_cache_dir_exists()
+        partial_file = self._get_partial_file(query)
+        partial = self._open_partial_file(partial_file)
+        if partial is None:
+            self.printer.log_debug(
+                "Partial results file %s is used by the other process. "
+                "Fetching all patches without it." % partial_file)
+            yield from self._iter_query_pages(query, None, 0)
+            return
+        with partial:
+            partial_results = self._load_partial_results(partial, query)
+            if partial_results is None:
+                self._write_partial_header(partial, query)
+                yield from self._iter_query_pages(query, partial, 0)
+                self._remove_partial_file(partial_file)
+                return
+
+            created, fetched, changes = partial_results
+            self.printer.log_debug(
+                "Resuming query from %s patches fetched before" % fetched)
+            changes = {change['id']: change for change in changes}
+            for change in self._iter_query_pages(query, partial, fetched):
+                changes[change['id']] = change
+            self._remove_partial_file(partial_file)
+        updated_since_query = self._get_updated_since_query(query, created)
+        self.printer.log_debug(
+            "Fetching patches updated since the query was started with "
+            "query: %s" % updated_since_query)
+        for change in self._iter_json_data_from_query(updated_since_query):
+            changes[change['id']] = change
+        yield from changes.values()
+
+    def _iter_query_pages(self, query, partial, start):
+        """Yield patches matched by the query, starting from start.
+
+        Each page is appended to the partial results file (if it is given),
+        followed by the checkpoint. Interrupted pages are retried from the
+        first missing patch.
+        """
+        query_errors = 0
+        while True:
+            page_start_time = time.time()
+            page_changes = 0
+            stats = None
+            output = self.transport.query(query, start,
+                                          self._fetch_patch_sets)
+            while True:
+                try:
+                    record = next(output)
+                except StopIteration as result:
+                    error = result.value
+                    break
+                if record.get('type') == 'stats':
+                    stats = record
+                    continue
+                if record.get('type') == 'error':
+                    # Gerrit failed to run the query, page is retried
+                    # like interrupted one
+                    error = record.get('message')
+                    output.close()
+                    break
+                record = project_change(record)
+                page_changes += 1
+                if partial:
+                    self._write_partial_record(partial, record)
+                yield record
+            start += page_changes
+            if partial:
+                self._write_partial_record(
+                    partial, {'type': 'checkpoint', 'start': start})
+                partial.flush()
+            self.printer.log_debug(
+                "Page with %s patches fetched in %.2f seconds" % (
+                    page_changes, time.time() - page_start_time))
+
+            if not stats:
+                # Output was interrupted before Gerrit sent stats of the
+                # query. Patches received so far are already counted so
+                # next request will continue from the first missing one.
+                if page_changes:
+                    query_errors = 0
+                if query_errors < MAX_QUERY_ERRORS:
+                    query_errors += 1
+                    delay = self._get_retry_delay(query_errors)
                     self.printer.log_debug(
-                        "SSH connection failed %s time. Error: %s" % (
-                            ssh_errors, error))
+                        "Gerrit query failed %s time. Error: %s. "
+                        "Retrying in %.2f seconds" % (
+                            query_errors, error, delay))
+                    time.sleep(delay)
                     continue
                 else:
                     self.printer.log_error(
-                        "SSH connection failed %s time. Error: %s" % (
-                            ssh_errors, error))
+                        "Gerrit query failed %s time. Error: %s" % (
+                            query_errors, error))
                     sys.exit(1)
-
-            result = result.decode('utf-8')
-            lines = result.split('\n')[:-2]
-            data += [json.loads(line) for line in lines]
-
-            if not data:
-                self.printer.log_error('No patches found!')
-                sys.exit(1)
+            if error:
+                self.printer.log_debug("Gerrit query error output: %s" %
+                                       error)
 
             self.printer.log_debug(
                 'Found metadata for %s more patches, %s total so far' %
-                (len(lines), len(data)))
-            start += len(lines)
-            more_changes = json.loads(result.split('\n')[-2])['moreChanges']
-            if not more_changes:
+                (page_changes, start))
+            if not stats['moreChanges']:
                 break
 
-        data = sorted(data, key=lambda x: x['createdOn'])
+    def _get_json_data_from_query(self, query):
+        return list(self._iter_json_data_from_query(query))
+
+    def _get_json_data_from_sharded_query(self):
+        queries = self._get_sharded_queries()
+        changes = {}
+        with futures.ThreadPoolExecutor(
+                max_workers=self.config.fetch_workers) as executor:
+            for shard_data in executor.map(self._get_json_data_from_query,
+                                           queries):
+                # Shards may overlap on their boundaries so the same change
+                # can be returned more than once.
+                for change in shard_data:
+                    known_change = changes.get(change['id'])
+                    if (not known_change or
+                            known_change['lastUpdated'] <
+                            change['lastUpdated']):
+                        changes[change['id']] = change
+        return list(changes.values())
+
+    def _fetch_json_data(self):
+        if self.config.fetch_workers > 1:
+            data = self._get_json_data_from_sharded_query()
+        else:
+            data = self._get_json_data_from_query(self.query)
+        self._ensure_patches_found(data)
+        return sorted(data, key=lambda x: x['createdOn'])
+
+    def _refresh_json_data(self, data):
+        last_updated = self._get_cache_metadata().get('last_updated')
+        if last_updated is None:
+            last_updated = max(change['lastUpdated'] for change in data)
+        query = self._get_updated_since_query(self.query, last_updated)
+        self.printer.log_debug("Refreshing cached data with query: %s" %
+                               query)
+        changes = {change['id']: change for change in data}
+        new_changes = self._get_json_data_from_query(query)
+        for change in new_changes:
+            changes[change['id']] = change
+        self.printer.log_debug(
+            "Fetched %s updated patches, %s patches in total" % (
+                len(new_changes), len(changes)))
+
+        data = changes.values()
+        if self.config.newer_than:
+            # Drop changes which are not matched by the query anymore
+            oldest_update = time.time() - int(self.config.newer_than) * 86400
+            data = [change for change in data
+                    if change['lastUpdated'] >= oldest_update]
+        return sorted(data, key=lambda x: x['createdOn'])
+
+    def _get_json_data_from_store(self):
+        """Get data from the local store, fetching only what is missing.
+
+        Query is answered from the store if it has data for the same or
+        wider scope (e.g. all projects) and time range. Otherwise only
+        changes from the missing time range are fetched from Gerrit.
+        """
+        self._ensure_cache_dir_exists()
+        change_store = store.ChangeStore(
+            '%s/%s' % (self._cache_dir, store.STORE_FILE_NAME),
+            data_version=PROJECTION_VERSION)
+        now = int(time.time())
+        oldest_update = 0
+        if self.config.newer_than:
+            oldest_update = now - int(self.config.newer_than) * 86400
+        coverage = change_store.get_coverage(
+            self.projects, self.config.branch, self.status)
+        if coverage is None:
+            self.printer.log_debug("No data in the local store for query")
+            change_store.put_changes(self._get_json_data_from_query(
+                self.query))
+            covered_since, fetched_at = oldest_update, now
+        else:
+            covered_since, fetched_at = coverage
+            if covered_since > oldest_update:
+                older_than = (now - covered_since) // 86400
+                query = self._get_age_range_query(
+                    self.config.newer_than and int(self.config.newer_than),
+                    older_than)
+                self.printer.log_debug(
+                    "Fetching data missing in the local store with "
+                    "query: %s" % query)
+                change_store.put_changes(
+                    self._get_json_data_from_query(query))
+                covered_since = oldest_update
+            if self.config.refresh:
+                query = self._get_updated_since_query(self.query, fetched_at)
+                self.printer.log_debug(
+                    "Refreshing data in the local store with query: %s" %
+                    query)
+                change_store.put_changes(
+                    self._get_json_data_from_query(query))
+                fetched_at = now
+        change_store.set_coverage(
+            self.projects, self.config.branch, self.status,
+            covered_since, fetched_at)
+
+        data = list(change_store.get_changes(
+            self.projects, self.config.branch, self.status,
+            oldest_update, all_patch_sets=self.all_patch_sets))
+        change_store.close()
+        self._ensure_patches_found(data)
+        return data
+
+    def iter_json_data(self):
+        """Yield patches one by one, as soon as they are available.
+
+        Unlike get_json_data(), when data is fetched from Gerrit, each patch
+        is yielded as soon as it is received and parsed so it can be processed
+        while next ones are still being downloaded. Patches are not sorted in
+        such case.
+        """
+        if (self.config.store or self.config.refresh or
+                self.config.fetch_workers > 1):
+            yield from self.get_json_data()
+            return
+        found_patches = False
+        if self.config.cache:
+            for change in self._iter_json_data_from_cache():
+                found_patches = True
+                yield change
+            if found_patches:
+                return
+        for change in self._iter_json_data_into_cache(
+                self._iter_json_data_from_query(self.query)):
+            found_patches = True
+            yield change
+        self._ensure_patches_found(found_patches)
+
+    def refresh_json_data(self, data):
+        """Get data fetched before updated with patches changed since.
+
+        It is meant for processes which keep data in memory, so cache
+        doesn't have to be loaded again. Cache is updated too.
+        """
+        if self.config.store:
+            return self._get_json_data_from_store()
+        data = self._refresh_json_data(data)
+        self._put_json_data_in_cache(data)
         return data
 
     def get_json_data(self):
+        if self.config.store:
+            return self._get_json_data_from_store()
         data = None
-        if self.config.cache:
+        if self.config.cache or self.config.refresh:
             data = self._get_json_data_from_cache()
+        if data and self.config.refresh:
+            data = self._refresh_json_data(data)
+            self._put_json_data_in_cache(data)
         if not data:
-            data = self._get_json_data_from_query()
+            data = self._fetch_json_data()
             self._put_json_data_in_cache(data)
         return data
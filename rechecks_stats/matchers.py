@@ -0,0 +1,78 @@
+import re
+
+
+RECHECK = "recheck"
+MATCH_ALL = "all"
+MATCH_BARE = "bare"
+MATCH_WITH_REASON = "with_reason"
+
+_PATCH_SET_PREFIX_REGEX = re.compile(r"Patch Set [0-9]+:", re.IGNORECASE)
+_WORD_CHARS_EXTRA = "_\\+- "
+
+
+class RecheckMatcher(object):
+    """Linear time matcher of the recheck comments.
+
+    It gives the same results as regular expressions like:
+
+        ^(Patch Set [0-9]+:)?( [\\w\\\\+-]*)*(\\n\\n)?\\s*recheck
+
+    (for MATCH_ALL mode) followed by "$" (MATCH_BARE mode) or ".+$"
+    (MATCH_WITH_REASON mode), matched case insensitive. Such regexes have
+    nested quantifiers so they can backtrack a lot on long comments, e.g.
+    with many spaces. This matcher scans every comment at most once instead.
+
+    The word "recheck" can be preceded (after the optional "Patch Set N:"
+    prefix) only by words separated with spaces, where the first word starts
+    with a space, followed by any whitespaces. Once any other character is
+    found, comment can't match anymore so scanning stops there.
+    """
+
+    def __init__(self, mode=MATCH_ALL):
+        if mode not in (MATCH_ALL, MATCH_BARE, MATCH_WITH_REASON):
+            raise ValueError("Unknown recheck matcher mode: %s" % mode)
+        self.mode = mode
+
+    def __repr__(self):
+        return "RecheckMatcher(%r)" % self.mode
+
+    def _get_valid_endings(self, msg):
+        """Get range of positions where the word "recheck" may end."""
+        msg_len = len(msg)
+        if self.mode == MATCH_ALL:
+            return 0, msg_len
+        last_line_end = msg_len - 1 if msg.endswith("\n") else msg_len
+        if self.mode == MATCH_BARE:
+            return last_line_end, msg_len
+        # MATCH_WITH_REASON: at least one more character and no new lines,
+        # except of the one at the very end of the comment.
+        return msg.rfind("\n", 0, last_line_end) + 1, last_line_end - 1
+
+    def search(self, msg):
+        # Cheap check to skip most of the comments quickly
+        if RECHECK not in msg.lower():
+            return False
+
+        prefix = _PATCH_SET_PREFIX_REGEX.match(msg)
+        start = prefix.end() if prefix else 0
+        first_end, last_end = self._get_valid_endings(msg)
+        words_found = False
+        whitespaces_found = False
+        for i in range(start, len(msg)):
+            char = msg[i]
+            if (char in "rR" and first_end <= i + 7 <= last_end and
+                    msg[i:i + 7].lower() == RECHECK):
+                return True
+            if char.isspace():
+                # Space always can be part of the words but other whitespace
+                # characters are allowed only just before the "recheck" word
+                if char != " " or not (words_found or i == start):
+                    whitespaces_found = True
+                elif i == start:
+                    words_found = True
+            elif char.isalnum() or char in _WORD_CHARS_EXTRA:
+                if whitespaces_found or not words_found:
+                    return False
+            else:
+                return False
+        return False
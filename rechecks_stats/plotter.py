@@ -1,5 +1,3 @@
-import matplotlib.pyplot as plt
-
 PLOTTER = None
 
 
@@ -16,12 +14,18 @@ class Plotter(object):
         self.config = config
 
     def plot_avg_rechecks(self, plot_points):
+        # matplotlib is slow to import so do it only when plot is requested
+        import matplotlib.pyplot as plt
+
         x_values = list(plot_points.keys())
         y_values = list(plot_points.values())
+        if getattr(self.config, 'rolling', None):
+            time_window = '%s days' % self.config.rolling
+        else:
+            time_window = self.config.time_window
         plt.plot(x_values, y_values,
                  label=('Average number of failed builds '
-                        'before patch merge per %s' %
-                        self.config.time_window))
+                        'before patch merge per %s' % time_window))
         plt.xlabel('patch merge time')
         plt.ylabel('number of failed builds')
         plt.legend()
@@ -29,6 +33,8 @@ class Plotter(object):
         plt.show()
 
     def plot_patch_rechecks(self, points):
+        import matplotlib.pyplot as plt
+
         x_values = [patch['id'] for patch in points]
         y_values = [patch['counter'] for patch in points]
         plt.plot(x_values, y_values,
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from rechecks_stats import gerrit
+
+
+POINTS_CACHE_FILE_NAME = "points.sqlite"
+# Has to be increased every time when the way comments are matched changes,
+# e.g. when matchers are fixed, so results computed before are not used.
+POINTS_CACHE_VERSION = 1
+
+
+def get_patterns_fingerprint(patterns):
+    """Get fingerprint of the comment patterns used to compute results."""
+    description = [POINTS_CACHE_VERSION]
+    for pattern in patterns:
+        description.append([
+            pattern.name,
+            getattr(pattern.matcher, 'pattern', None) or
+            repr(pattern.matcher),
+            sorted(pattern.authors), pattern.only_last_ps,
+            pattern.keep_reasons])
+    return hashlib.sha1(json.dumps(description).encode()).hexdigest()
+
+
+def get_patch_key(patch):
+    return (patch['project'], patch.get('branch', ''), patch['id'])
+
+
+class PointsCache(object):
+    """Persistent cache of the comments matched in the patches.
+
+    For each patch and set of patterns (identified by fingerprint), cache
+    keeps timestamps of comments matching each of the patterns and matching
+    reasons. Such results don't depend on the time when they are computed
+    so they are valid until patch is updated, which is checked by its
+    lastUpdated timestamp.
+    """
+
+    def __init__(self, fingerprint, path=None):
+        if path is None:
+            cache_dir = "%s/%s" % (Path.home(), gerrit.CACHE_DIR_NAME)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = '%s/%s' % (cache_dir, POINTS_CACHE_FILE_NAME)
+        self.fingerprint = fingerprint
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    fingerprint TEXT NOT NULL,
+                    project TEXT NOT NULL,
+                    branch TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    last_updated INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (fingerprint, id, project, branch))
+                """)
+
+    def close(self):
+        self._connection.close()
+
+    def get_matches(self, patches):
+        """Get cached matches of the patches which were not updated since.
+
+        Returns dict with patch keys (project, branch, id) and matches.
+        """
+        last_updated = {get_patch_key(patch): patch['lastUpdated']
+                        for patch in patches}
+        ids = list(set(key[2] for key in last_updated))
+        matches = {}
+        # SQLite limits number of the query parameters
+        for i in range(0, len(ids), 500):
+            rows = self._connection.execute(
+                "SELECT project, branch, id, last_updated, data FROM matches "
+                "WHERE fingerprint = ? AND id IN (%s)" % ', '.join(
+                    '?' * len(ids[i:i + 500])),
+                [self.fingerprint] + ids[i:i + 500])
+            for project, branch, change_id, updated, data in rows:
+                key = (project, branch, change_id)
+                if last_updated.get(key) == updated:
+                    matches[key] = json.loads(data)
+        return matches
+
+    def put_matches(self, matches):
+        """Store matches of the patches.
+
+        Matches is a dict with patch keys (project, branch, id) and tuples
+        (lastUpdated, matches).
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.fingerprint, project, branch, change_id,
+                  last_updated, json.dumps(patch_matches))
+                 for (project, branch, change_id), (
+                     last_updated, patch_matches) in matches.items()])
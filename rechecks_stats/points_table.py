@@ -0,0 +1,163 @@
+import time
+
+import numpy as np
+
+
+TIME_WINDOWS = ('day', 'week', 'month', 'quarter', 'year')
+# UTC offset of the local time zone is checked once for each such period of
+# time (in seconds), offset is checked for every point only in periods in
+# which it changes.
+_UTC_OFFSET_RESOLUTION = 900
+
+
+class PointsTable(object):
+    """Columnar table of the points.
+
+    Merge timestamps, counters and projects of the points are stored in the
+    NumPy arrays so points can be grouped by any time window (and project)
+    with vectorized operations, without walking all points again.
+    """
+
+    def __init__(self, points, counter='counter'):
+        self.merged = np.array([point['merged'] for point in points],
+                               dtype=np.int64)
+        self.counters = np.array([point[counter] for point in points],
+                                 dtype=np.int64)
+        self.projects, self.project_codes = np.unique(
+            np.array([point['project'] for point in points], dtype=str),
+            return_inverse=True)
+        self.days = self._get_local_days(self.merged)
+        self._avg_cache = {}
+
+    @staticmethod
+    def _get_local_days(timestamps):
+        """Get days (since epoch) in the local time zone.
+
+        It gives the same dates as datetime.date.fromtimestamp().
+        """
+        periods, periods_idx = np.unique(
+            timestamps // _UTC_OFFSET_RESOLUTION, return_inverse=True)
+        periods_offsets = np.array(
+            [time.localtime(int(period) * _UTC_OFFSET_RESOLUTION).tm_gmtoff
+             for period in periods], dtype=np.int64)
+        periods_end_offsets = np.array(
+            [time.localtime(
+                (int(period) + 1) * _UTC_OFFSET_RESOLUTION - 1).tm_gmtoff
+             for period in periods], dtype=np.int64)
+        offsets = periods_offsets[periods_idx]
+        changed = (periods_offsets != periods_end_offsets)[periods_idx]
+        offsets[changed] = [time.localtime(int(timestamp)).tm_gmtoff
+                            for timestamp in timestamps[changed]]
+        return (timestamps + offsets) // 86400
+
+    @staticmethod
+    def _get_years(days):
+        return days.astype('datetime64[D]').astype(
+            'datetime64[Y]').astype(np.int64) + 1970
+
+    def _get_window_keys(self, time_window):
+        """Get codes of the time windows for each point and their labels.
+
+        Codes are chronologically ordered integers, labels are the same as
+        the keys used by the AvgDataParser before.
+        """
+        if time_window == 'day':
+            codes = self.days
+            return codes, lambda code: str(np.datetime64(int(code), 'D'))
+        if time_window == 'week':
+            # ISO week belongs to the year in which its Thursday is.
+            # 1970-01-01 was Thursday.
+            weekdays = (self.days + 3) % 7
+            thursdays = self.days - weekdays + 3
+            iso_years = self._get_years(thursdays)
+            first_days = (iso_years - 1970).astype(
+                'datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+            weeks = (thursdays - first_days) // 7 + 1
+            codes = iso_years * 100 + weeks
+            return codes, lambda code: "%s-%s" % divmod(int(code), 100)
+        if time_window in ('month', 'quarter'):
+            months = self.days.astype('datetime64[D]').astype(
+                'datetime64[M]').astype(np.int64)
+            years = months // 12 + 1970
+            months = months % 12 + 1
+            if time_window == 'month':
+                codes = years * 100 + months
+                return codes, lambda code: "%s-%s" % divmod(int(code), 100)
+            codes = years * 10 + (months - 1) // 3 + 1
+            return codes, lambda code: "%s-Q%s" % divmod(int(code), 10)
+        codes = self._get_years(self.days)
+        return codes, int
+
+    def _get_project_mask(self, project):
+        if isinstance(project, str):
+            project = (project,)
+        return np.isin(self.project_codes,
+                       np.flatnonzero(np.isin(self.projects, project)))
+
+    def get_avg(self, time_window, project=None):
+        """Get average value of the counter in each time window.
+
+        Returned dict is chronologically ordered. If project (or tuple of
+        projects) is given, only points of that project are taken into
+        account.
+        """
+        cache_key = (time_window, project)
+        if cache_key in self._avg_cache:
+            return self._avg_cache[cache_key]
+        codes, get_label = self._get_window_keys(time_window)
+        counters = self.counters
+        if project is not None:
+            mask = self._get_project_mask(project)
+            codes = codes[mask]
+            counters = counters[mask]
+        windows, windows_idx = np.unique(codes, return_inverse=True)
+        sums = np.bincount(windows_idx, weights=counters,
+                           minlength=len(windows))
+        counts = np.bincount(windows_idx, minlength=len(windows))
+        self._avg_cache[cache_key] = {
+            get_label(window): float(window_sum) / int(count)
+            for window, window_sum, count in zip(windows, sums, counts)}
+        return self._avg_cache[cache_key]
+
+    def get_rolling_avg(self, days, step=1, project=None):
+        """Get average value of the counter in the rolling windows.
+
+        Each window is that many days long and windows end every "step"
+        days, the last one on the day of the newest point. Returned dict is
+        chronologically ordered and keyed by the last day of the window.
+        Windows without points are skipped.
+
+        Sums of the windows are differences of the cumulative sums of the
+        counters, so cost doesn't depend on the number of windows and their
+        length.
+        """
+        if days < 1 or step < 1:
+            raise ValueError("Rolling window and its step must be at least "
+                             "one day long")
+        cache_key = ('rolling', days, step, project)
+        if cache_key in self._avg_cache:
+            return self._avg_cache[cache_key]
+        points_days = self.days
+        counters = self.counters
+        if project is not None:
+            mask = self._get_project_mask(project)
+            points_days = points_days[mask]
+            counters = counters[mask]
+        if not len(points_days):
+            return {}
+        order = np.argsort(points_days, kind='stable')
+        points_days = points_days[order]
+        cumulative_sums = np.concatenate(([0], np.cumsum(counters[order])))
+        last_days = np.arange(points_days[-1], points_days[0] - 1,
+                              -step)[::-1]
+        # Window ending on the last_day covers (last_day - days, last_day]
+        starts = np.searchsorted(points_days, last_days - days, 'right')
+        ends = np.searchsorted(points_days, last_days, 'right')
+        counts = ends - starts
+        sums = cumulative_sums[ends] - cumulative_sums[starts]
+        self._avg_cache[cache_key] = {
+            str(np.datetime64(int(last_day), 'D')):
+                int(window_sum) / int(count)
+            for last_day, window_sum, count in zip(last_days, sums, counts)
+            if count}
+        return self._avg_cache[cache_key]
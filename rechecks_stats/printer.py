@@ -1,4 +1,8 @@
-from prettytable import PrettyTable
+import atexit
+import csv
+import heapq
+import json
+import sys
 
 PRINTER = None
 
@@ -10,132 +14,220 @@ def get_printer(config):
     return PRINTER
 
 
+class TableWriter(object):
+    """Writer of the human readable reports.
+
+    Table has to know all rows to align columns so it is printed when writer
+    is closed.
+    """
+
+    def __init__(self, printer, field_names, output=None):
+        # Not needed e.g. for csv reports so imported only when needed
+        from prettytable import PrettyTable
+        self.printer = printer
+        self.output = output
+        self.table = PrettyTable()
+        self.table.align = "l"
+        self.table.field_names = field_names
+
+    def write_row(self, row):
+        self.table.add_row([round(value, 2) if isinstance(value, float)
+                            else value for value in row])
+
+    def close(self):
+        self.printer.print_msg(self.table, self.output)
+
+
+class CsvWriter(object):
+    """Writer of the CSV reports, rows are written as soon as they come."""
+
+    def __init__(self, printer, field_names, output=None):
+        self.writer = csv.writer(output or printer.output,
+                                 lineterminator='\n')
+        self.writer.writerow(field_names)
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter(object):
+    """Writer of the JSON Lines reports, each row is single JSON object."""
+
+    def __init__(self, printer, field_names, output=None):
+        self.output = output or printer.output
+        self.field_names = field_names
+
+    def write_row(self, row):
+        self.output.write(json.dumps(dict(zip(self.field_names, row))) + '\n')
+
+    def close(self):
+        pass
+
+
+WRITERS = {'human': TableWriter,
+           'csv': CsvWriter,
+           'jsonl': JsonLinesWriter}
+# Extensions of the files to which reports in each format are written
+EXTENSIONS = {'human': 'txt',
+              'csv': 'csv',
+              'jsonl': 'jsonl'}
+
+
 class Printer(object):
 
     def __init__(self, config):
         self.config = config
-
-    def print_msg(self, msg):
-        print(msg)
+        self._output = None
+
+    @property
+    def output(self):
+        """File to which reports are written, stdout by default."""
+        if not getattr(self.config, 'output', None):
+            # Not kept so redirected stdout is used too
+            return sys.stdout
+        if self._output is None:
+            self._output = open(self.config.output, 'w')
+            atexit.register(self._output.close)
+        return self._output
+
+    def print_msg(self, msg, output=None):
+        print(msg, file=output or self.output)
 
     def log_error(self, msg):
-        self.print_msg(msg)
+        print(msg)
 
     def log_debug(self, msg):
         if self.config.verbose:
-            self.print_msg(msg)
-
-    @staticmethod
-    def _get_table():
-        table = PrettyTable()
-        table.align = "l"
-        return table
-
-    def _print_avg_as_csv(self, points):
-        self.print_msg("%s,Average number of failed builds" %
-                       self.config.time_window)
-        for week, value in points.items():
-            self.print_msg('%s,%s' % (week, value))
-
-    def _print_avg_as_human_readable(self, points):
-        table = self._get_table()
-        table.field_names = [self.config.time_window, "Rechecks"]
-        for week, value in points.items():
-            table.add_row([week, round(value, 2)])
-        self.print_msg(table)
-
-    def print_avg_rechecks(self, plot_points):
-        if self.config.report_format == 'csv':
-            self._print_avg_as_csv(plot_points)
+            print(msg)
+
+    def _get_writer(self, field_names, output=None):
+        writer_class = WRITERS.get(self.config.report_format, TableWriter)
+        return writer_class(self, field_names, output)
+
+    def _get_top(self, rows, key):
+        """Get rows sorted by key, only top ones if --top is set.
+
+        Only top rows are kept in memory while they are selected.
+        """
+        top = getattr(self.config, 'top', None)
+        if top:
+            return heapq.nlargest(top, rows, key=key)
+        return sorted(rows, key=key, reverse=True)
+
+    def _get_time_window_name(self):
+        if getattr(self.config, 'rolling', None):
+            return "%s days until" % self.config.rolling
+        return self.config.time_window
+
+    def print_avg_rechecks(self, plot_points, output=None):
+        if self.config.report_format == 'human':
+            field_names = [self._get_time_window_name(), "Rechecks"]
         else:
-            self._print_avg_as_human_readable(plot_points)
-
-    def print_patch_rechecks(self, points, avg):
-        points = sorted(points, key=lambda x: x['counter'], reverse=True)
-        if self.config.report_format == 'csv':
-            self._print_rechecks_as_csv(points)
+            field_names = [self._get_time_window_name(),
+                           "Average number of failed builds"]
+        writer = self._get_writer(field_names, output)
+        for week, value in plot_points.items():
+            writer.write_row([week, value])
+        writer.close()
+
+    def print_repos_avg_rechecks(self, repos_avg):
+        if self.config.report_format == 'human':
+            field_names = ["Repository", "Rechecks"]
         else:
-            self._print_rechecks_as_human_readable(points, avg)
+            field_names = ["Repository", "Average number of failed builds"]
+        writer = self._get_writer(field_names)
+        repos_avg = repos_avg.items()
+        if getattr(self.config, 'top', None):
+            repos_avg = self._get_top(repos_avg, key=lambda i: i[1])
+        for repo, value in repos_avg:
+            writer.write_row([repo, value])
+        writer.close()
 
-    def _print_rechecks_as_csv(self, points):
-        self.print_msg("%s,Average number of failed builds" %
-                       self.config.time_window)
-        for patch_data in points:
-            self.print_msg('%s,%s,%s,%s' % (patch_data['subject'],
-                                            patch_data['url'],
-                                            patch_data['project'],
-                                            patch_data['counter']))
-
-    def _print_rechecks_as_human_readable(self, points, avg):
-        table = self._get_table()
-        table.field_names = ['Subject', 'URL', 'Project', 'Rechecks']
-        avg_marker_drawed = False
+    def print_patch_rechecks(self, points, avg):
+        human_readable = self.config.report_format == 'human'
+        if human_readable or getattr(self.config, 'top', None):
+            points = self._get_top(points, key=lambda x: x['counter'])
+        writer = self._get_writer(['Subject', 'URL', 'Project', 'Rechecks'])
+        # Marker is only drawn in the table, other formats are meant to be
+        # read by scripts
+        avg_marker_drawed = not human_readable
         for patch_data in points:
             # Data is already sorted so we can draw marker in single place
             # in table
             if (not avg_marker_drawed and
                     patch_data['counter'] < avg):
-                table.add_row(
+                writer.write_row(
                     ["AVERAGE NUMBER OF RECHECKS",
                      "====================================",
                      "=================",
                      round(avg, 2)])
                 avg_marker_drawed = True
-            table.add_row(
+            writer.write_row(
                 [patch_data['subject'],
                  patch_data['url'],
                  patch_data['project'],
-                 round(patch_data['counter'], 2)])
-        self.print_msg(table)
+                 patch_data['counter']])
+        writer.close()
 
     def print_project_bare_rechecks(self, points, print_all_rows=False):
-        table = self._get_table()
-        table.field_names = [
+        writer = self._get_writer([
             'Subject', 'URL', 'Project',
-            'Bare rechecks', 'All Rechecks', 'Bare rechecks [%]']
+            'Bare rechecks', 'All Rechecks', 'Bare rechecks [%]'])
+        points = (patch_data for patch_data in points
+                  if print_all_rows or patch_data['all_rechecks'] != 0)
+        if getattr(self.config, 'top', None):
+            points = self._get_top(points, key=lambda x: x['bare_rechecks'])
         for patch_data in points:
-            if print_all_rows or patch_data['all_rechecks'] != 0:
-                table.add_row(
-                    [patch_data['subject'],
-                     patch_data['url'],
-                     patch_data['project'],
-                     patch_data['bare_rechecks'],
-                     patch_data['all_rechecks'],
-                     round(patch_data['bare_rechecks_percentage'], 2)])
-        self.print_msg(table)
+            writer.write_row(
+                [patch_data['subject'],
+                 patch_data['url'],
+                 patch_data['project'],
+                 patch_data['bare_rechecks'],
+                 patch_data['all_rechecks'],
+                 patch_data['bare_rechecks_percentage']])
+        writer.close()
 
     def print_global_bare_rechecks(self, points, print_all_rows=False):
-        table = self._get_table()
         field_names = []
         project_field_included = False
         team_field_included = False
-        if 'project' in points[0].keys():
+        if points and 'project' in points[0].keys():
             field_names.append('Project')
             project_field_included = True
-        if 'team' in points[0].keys():
+        if points and 'team' in points[0].keys():
             field_names.append('Team')
             team_field_included = True
         field_names += [
             'Bare rechecks', 'All Rechecks', 'Bare rechecks [%]']
-        table.field_names = field_names
+        writer = self._get_writer(field_names)
+        points = (patch_data for patch_data in points
+                  if print_all_rows or patch_data['all_rechecks'] != 0)
+        if getattr(self.config, 'top', None):
+            points = self._get_top(
+                points, key=lambda x: x['bare_rechecks_percentage'])
         for patch_data in points:
-            if print_all_rows or patch_data['all_rechecks'] != 0:
-                row_data = []
-                if project_field_included:
-                    row_data.append(patch_data['project'])
-                if team_field_included:
-                    row_data.append(patch_data['team'])
-                row_data += [patch_data['bare_rechecks'],
-                             patch_data['all_rechecks'],
-                             round(patch_data['bare_rechecks_percentage'], 2)]
-                table.add_row(row_data)
-        self.print_msg(table)
+            row_data = []
+            if project_field_included:
+                row_data.append(patch_data['project'])
+            if team_field_included:
+                row_data.append(patch_data['team'])
+            row_data += [patch_data['bare_rechecks'],
+                         patch_data['all_rechecks'],
+                         patch_data['bare_rechecks_percentage']]
+            writer.write_row(row_data)
+        writer.close()
 
     def print_reacheck_reasons(self, points):
-        table = self._get_table()
-        table.field_names = [
-            "Recheck comment", "Number of occurences"]
-        for reason, counter in points.items():
-            reason = reason.replace("\n", "")
-            table.add_row([reason, counter])
-        self.print_msg(table)
\ No newline at end of file
+        writer = self._get_writer(
+            ["Recheck comment", "Number of occurences"])
+        points = points.items()
+        if getattr(self.config, 'top', None):
+            points = self._get_top(points, key=lambda i: i[1])
+        for reason, counter in points:
+            if self.config.report_format == 'human':
+                reason = reason.replace("\n", "")
+            writer.write_row([reason, counter])
+        writer.close()
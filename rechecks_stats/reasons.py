@@ -0,0 +1,94 @@
+import heapq
+import re
+
+from rechecks_stats import matchers
+
+
+# Default number of reasons counted by the heavy hitters sketch
+REASONS_SKETCH_SIZE = 1000
+# When only top N reasons are printed, sketch counts that many times more
+# of them, so the top ones are counted more accurately
+REASONS_SKETCH_SIZE_PER_TOP = 10
+
+BUG_PLACEHOLDER = "<bug>"
+JOB_PLACEHOLDER = "<job>"
+URL_PLACEHOLDER = "<url>"
+
+_PATCH_SET_PREFIX_REGEX = re.compile(r"\s*Patch Set [0-9]+:", re.IGNORECASE)
+_BUG_URL_REGEX = re.compile(
+    r"https?://(bugs\.)?launchpad\.net/\S*|https?://\S*/bugs?/\S*")
+_URL_REGEX = re.compile(r"https?://\S+")
+_BUG_NUMBER_REGEX = re.compile(r"\b(bug|lp)\s*[#:]?\s*[0-9]+\b")
+# Zuul job names are words joined with hyphens, like "tempest-full-py3" or
+# "neutron-tempest-plugin-scenario-ovn". Words joined with a single hyphen
+# (e.g. "nova-compute" or "re-run") are usually something else.
+_JOB_NAME_REGEX = re.compile(r"\b[\w.]+(-[\w.]+){2,}\b")
+_WHITESPACES_REGEX = re.compile(r"\s+")
+
+
+def normalize_reason(msg):
+    """Get normalized reason of the recheck comment.
+
+    Everything before the word "recheck" (the "Patch Set N:" prefix and
+    votes) is removed, case and whitespaces are normalized and links to the
+    bugs, other links and job names are replaced with placeholders, so the
+    same reasons given for the different patches are grouped together.
+    """
+    prefix = _PATCH_SET_PREFIX_REGEX.match(msg)
+    start = prefix.end() if prefix else 0
+    reason = msg[start:].lower()
+    reason = reason[max(reason.find(matchers.RECHECK), 0):]
+    reason = _BUG_URL_REGEX.sub(BUG_PLACEHOLDER, reason)
+    reason = _URL_REGEX.sub(URL_PLACEHOLDER, reason)
+    reason = _BUG_NUMBER_REGEX.sub("bug " + BUG_PLACEHOLDER, reason)
+    reason = _JOB_NAME_REGEX.sub(JOB_PLACEHOLDER, reason)
+    return _WHITESPACES_REGEX.sub(" ", reason).strip()
+
+
+class SpaceSaving(object):
+    """Heavy hitters sketch counting items in the fixed memory.
+
+    It is the Space-Saving algorithm: at most "size" items are counted and
+    when new item comes and there is no room for it, it replaces the item
+    with the lowest count and takes over its count. Counts are exact as long
+    as there are no more than "size" distinct items, otherwise they can be
+    overestimated, by at most total number of items divided by size. Every
+    item which is more frequent than that is guaranteed to be counted.
+    """
+
+    def __init__(self, size=REASONS_SKETCH_SIZE):
+        if size < 1:
+            raise ValueError("Size of the sketch must be positive")
+        self.size = size
+        self.counts = {}
+        # Heap of (count, item) pairs used to find item with the lowest
+        # count. Pairs aren't updated when items are counted, outdated ones
+        # are skipped when they come to the top of the heap.
+        self._heap = []
+
+    def add(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.size:
+            self.counts[item] = count
+        else:
+            min_count, min_item = self._pop_min()
+            self.counts[item] = min_count + count
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 2 * self.size:
+            self._heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                del self.counts[item]
+                return count, item
+
+    def top(self, n=None):
+        """Get list of (item, count) pairs, from the most frequent ones."""
+        if n is None:
+            return sorted(self.counts.items(), key=lambda i: i[1],
+                          reverse=True)
+        return heapq.nlargest(n, self.counts.items(), key=lambda i: i[1])
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import collections
+import os
 import sys
 
 from rechecks_stats import config
@@ -9,13 +11,81 @@ from rechecks_stats import plotter
 from rechecks_stats import printer
 
 
+def _get_repos(repos_file):
+    with open(repos_file) as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.startswith('#')]
+
+
+def _get_repos_data(args, repos):
+    repos_data = collections.defaultdict(list)
+    for i in range(0, len(repos), gerrit.MAX_PROJECTS_PER_QUERY):
+        g = gerrit.Gerrit(args, status='merged',
+                          projects=repos[i:i + gerrit.MAX_PROJECTS_PER_QUERY],
+                          allow_empty=True)
+        for patch in g.iter_json_data():
+            repos_data[patch['project']].append(patch)
+    return repos_data
+
+
+def _get_avg_failures(args, avg_dp):
+    if args.rolling:
+        return avg_dp.get_rolling_avg_failures()
+    return avg_dp.get_avg_failures()
+
+
+def run_batch(args):
+    """Get stats for all repositories from the repos file at once.
+
+    Data for many repositories is fetched with a single Gerrit query.
+    Depending on the options, either average number of rechecks for each
+    repository is printed or stats for each repository are written to the
+    separate files in the output directory.
+    """
+    _printer = printer.get_printer(args)
+    repos = _get_repos(args.repos_file)
+    repos_data = _get_repos_data(args, repos)
+
+    repos_avg = {}
+    for repo in repos:
+        avg_dp = data_parser.AvgDataParser(args, repos_data.get(repo, []),
+                                           allow_no_points=True)
+        if not avg_dp.points:
+            _printer.log_debug("No patches found for %s" % repo)
+            continue
+        if args.output_dir:
+            output_file_name = '%s_%s.%s' % (
+                repo.split('/')[-1], args.newer_than or 'all',
+                printer.EXTENSIONS.get(args.report_format, 'txt'))
+            output_path = os.path.join(args.output_dir, output_file_name)
+            _printer.log_debug("Writing stats for %s to %s" % (
+                repo, output_path))
+            with open(output_path, 'w') as output:
+                _printer.print_avg_rechecks(_get_avg_failures(args, avg_dp),
+                                            output)
+        else:
+            repos_avg[repo] = round(avg_dp.get_avg_number_or_rechecks(), 2)
+
+    if args.output_dir:
+        return
+    if args.only_average:
+        for repo, repo_avg in repos_avg.items():
+            _printer.print_msg("%s: %s" % (repo, repo_avg))
+    else:
+        _printer.print_repos_avg_rechecks(repos_avg)
+
+
 def main():
     args = config.get_rechecks_stats_parser()
     _printer = printer.get_printer(args)
     _plotter = plotter.get_plotter(args)
 
+    if args.repos_file:
+        run_batch(args)
+        sys.exit(0)
+
     g = gerrit.Gerrit(args, status='merged')
-    data = g.get_json_data()
+    data = g.iter_json_data()
 
     # this will go to the new class/module, something like rechecks_data:
     avg_dp = data_parser.AvgDataParser(args, data)
@@ -33,7 +103,7 @@ def main():
         avg_rechecks = round(avg_dp.get_avg_number_or_rechecks(), 2)
         _printer.print_patch_rechecks(avg_dp.points, avg_rechecks)
     else:
-        plot_points = avg_dp.get_avg_failures()
+        plot_points = _get_avg_failures(args, avg_dp)
         if args.plot:
             _plotter.plot_avg_rechecks(plot_points)
         _printer.print_avg_rechecks(plot_points)
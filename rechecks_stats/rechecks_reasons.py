@@ -12,6 +12,6 @@ def main():
 
     g = gerrit.Gerrit(args, all_patch_sets=True)
 
-    data = g.get_json_data()
+    data = g.iter_json_data()
     dp = data_parser.RechecksReasonsDataParser(args, data)
     _printer.print_reacheck_reasons(dp.get_rechecks_reasons())
\ No newline at end of file
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import collections
+import http.server
+import json
+import socketserver
+import sys
+import threading
+import time
+from urllib import parse
+
+from rechecks_stats import config
+from rechecks_stats import data_parser
+from rechecks_stats import gerrit
+from rechecks_stats import printer
+
+
+class StatsSnapshot(object):
+    """Stats computed from the single version of the data.
+
+    Snapshot is never changed once it is built (except of the averages per
+    time window which are computed when they are requested for the first
+    time and cached), so it can be used by many request handlers at once
+    while next one is built in the background.
+    """
+
+    def __init__(self, config, rechecks_data, bare_rechecks_data):
+        self.updated = int(time.time())
+        self.avg_dp = data_parser.AvgDataParser(config, rechecks_data,
+                                                allow_no_points=True)
+        self.bare_dp = data_parser.BareRechecksDataParser(
+            config, bare_rechecks_data, allow_no_points=True)
+        self.patches = len(self.avg_dp.points)
+
+        self._rechecks_per_project = collections.defaultdict(lambda: [0, 0])
+        for point in self.avg_dp.points:
+            self._rechecks_per_project[point.project][0] += point['counter']
+            self._rechecks_per_project[point.project][1] += 1
+        self.teams = collections.defaultdict(list)
+        for project_stats in self.bare_dp.get_bare_rechecks_cube()['project']:
+            if project_stats.get('team'):
+                self.teams[project_stats['team']].append(
+                    project_stats['project'])
+        if self.patches:
+            # Warm up the most common queries
+            self.avg_dp.get_all_avg_failures()
+
+    def get_projects(self, team=None):
+        if team is None:
+            return None
+        if team not in self.teams:
+            raise LookupError("Unknown team %s" % team)
+        return tuple(self.teams[team])
+
+    def get_avg_rechecks(self, projects=None):
+        build_failures, patches = 0, 0
+        for project, (project_failures, project_patches) in (
+                self._rechecks_per_project.items()):
+            if projects is None or project in projects:
+                build_failures += project_failures
+                patches += project_patches
+        return build_failures / patches if patches else None
+
+    def get_avg_rechecks_per_project(self, projects=None):
+        return {
+            project: project_failures / project_patches
+            for project, (project_failures, project_patches) in
+            sorted(self._rechecks_per_project.items())
+            if projects is None or project in projects}
+
+    def get_avg_failures(self, time_window, projects=None):
+        if not self.patches:
+            return {}
+        return self.avg_dp.get_avg_failures(time_window, projects)
+
+    def get_rolling_avg_failures(self, days, step, projects=None):
+        if not self.patches:
+            return {}
+        return self.avg_dp.get_rolling_avg_failures(days, step, projects)
+
+    @staticmethod
+    def _get_patch_stats(point):
+        return {'id': point.id,
+                'subject': point.subject,
+                'url': point.url,
+                'project': point.project,
+                'bare_rechecks': point['bare_rechecks'],
+                'all_rechecks': point['all_rechecks'],
+                'bare_rechecks_percentage': point.bare_rechecks_percentage}
+
+    def get_bare_rechecks(self, level, team=None):
+        if team is not None:
+            # Check that team is known
+            self.get_projects(team)
+        stats = self.bare_dp.get_bare_rechecks_cube(team)[level]
+        if level == 'patch':
+            return [self._get_patch_stats(point) for point in stats]
+        return stats
+
+    def get_bare_rechecks_per_patch(self, project):
+        return [self._get_patch_stats(point)
+                for point in self.bare_dp.get_bare_rechecks_stats_per_patch()
+                if point.project == project]
+
+
+class StatsService(object):
+    """Keeps stats in memory and refreshes them in the background.
+
+    Data is fetched with the same queries as the rechecks-stats and
+    bare-rechecks commands do. Then only patches updated since the last
+    refresh are fetched from Gerrit, cache is updated too.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.printer = printer.get_printer(config)
+        # Only updated patches are fetched after the first time
+        self.config.refresh = True
+        self._rechecks_gerrit = gerrit.Gerrit(config, status='merged')
+        self._bare_rechecks_gerrit = gerrit.Gerrit(config,
+                                                   all_patch_sets=True)
+        self._rechecks_data = None
+        self._bare_rechecks_data = None
+        self.snapshot = None
+        self.refreshing = False
+        self.last_error = None
+
+    def _get_data(self, _gerrit, data):
+        if data is None:
+            return _gerrit.get_json_data()
+        return _gerrit.refresh_json_data(data)
+
+    def refresh(self):
+        start = time.time()
+        self.refreshing = True
+        try:
+            self._rechecks_data = self._get_data(self._rechecks_gerrit,
+                                                 self._rechecks_data)
+            self._bare_rechecks_data = self._get_data(
+                self._bare_rechecks_gerrit, self._bare_rechecks_data)
+            self.snapshot = StatsSnapshot(self.config, self._rechecks_data,
+                                          self._bare_rechecks_data)
+        finally:
+            self.refreshing = False
+        self.last_error = None
+        self.printer.log_debug("Stats of %s patches refreshed in %.2fs" % (
+            self.snapshot.patches, time.time() - start))
+
+    def run_refresh_loop(self):
+        while True:
+            time.sleep(self.config.refresh_interval)
+            try:
+                self.refresh()
+            # Gerrit errors exit the commands but service should keep
+            # stats computed before
+            except (Exception, SystemExit) as err:
+                self.last_error = "%s: %s" % (type(err).__name__, err)
+                self.printer.log_error(
+                    "Refreshing stats failed: %s" % self.last_error)
+
+    def get_status(self, params):
+        return {'updated': self.snapshot.updated,
+                'patches': self.snapshot.patches,
+                'refreshing': self.refreshing,
+                'last_error': self.last_error}
+
+    def get_rechecks(self, params):
+        from rechecks_stats import points_table
+        snapshot = self.snapshot
+        time_window = params.get('window', 'week')
+        if time_window not in points_table.TIME_WINDOWS:
+            raise ValueError("Time window has to be one of: %s" %
+                             ", ".join(points_table.TIME_WINDOWS))
+        project = params.get('project')
+        projects = snapshot.get_projects(params.get('team'))
+        if project:
+            projects = (project,)
+        result = {'project': project,
+                  'team': params.get('team'),
+                  'time_window': time_window,
+                  'average': snapshot.get_avg_rechecks(projects)}
+        if params.get('rolling'):
+            result['time_window'] = None
+            result['rolling'] = int(params['rolling'])
+            result['rolling_step'] = int(params.get('step', 1))
+            result['values'] = snapshot.get_rolling_avg_failures(
+                result['rolling'], result['rolling_step'], projects)
+        else:
+            result['values'] = snapshot.get_avg_failures(time_window,
+                                                         projects)
+        return result
+
+    def get_rechecks_per_project(self, params):
+        snapshot = self.snapshot
+        projects = snapshot.get_projects(params.get('team'))
+        return {'team': params.get('team'),
+                'projects': snapshot.get_avg_rechecks_per_project(projects)}
+
+    def get_bare_rechecks(self, params):
+        snapshot = self.snapshot
+        if params.get('project'):
+            return {'project': params['project'],
+                    'patches': snapshot.get_bare_rechecks_per_patch(
+                        params['project'])}
+        level = params.get('by', 'project')
+        if level not in data_parser.BARE_RECHECKS_LEVELS:
+            raise ValueError("Level of the stats has to be one of: %s" %
+                             ", ".join(data_parser.BARE_RECHECKS_LEVELS))
+        if level == 'team' and not self.config.projects_file:
+            raise ValueError("Stats per team require --projects-file")
+        return {'team': params.get('team'),
+                'level': level,
+                'stats': snapshot.get_bare_rechecks(level,
+                                                    params.get('team'))}
+
+
+class StatsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    routes = {'/status': StatsService.get_status,
+              '/rechecks': StatsService.get_rechecks,
+              '/rechecks/projects': StatsService.get_rechecks_per_project,
+              '/bare-rechecks': StatsService.get_bare_rechecks}
+
+    def log_message(self, format, *args):
+        self.server.service.printer.log_debug(
+            "%s %s" % (self.address_string(), format % args))
+
+    def _send_json(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = parse.urlparse(self.path)
+        params = dict(parse.parse_qsl(url.query))
+        route = self.routes.get(url.path.rstrip('/') or '/')
+        if route is None:
+            self._send_json(404, {'error': 'Unknown path %s' % url.path})
+            return
+        try:
+            self._send_json(200, route(self.server.service, params))
+        except LookupError as err:
+            self._send_json(404, {'error': str(err.args[0])})
+        except ValueError as err:
+            self._send_json(400, {'error': str(err)})
+
+
+class StatsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    # Same as http.server.ThreadingHTTPServer which is available only since
+    # Python 3.7
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super(StatsServer, self).__init__(address, StatsRequestHandler)
+        self.service = service
+
+
+def main():
+    args = config.get_rechecks_service_parser()
+    _printer = printer.get_printer(args)
+
+    service = StatsService(args)
+    service.refresh()
+    threading.Thread(target=service.run_refresh_loop, daemon=True).start()
+
+    server = StatsServer((args.host, args.port), service)
+    _printer.log_debug("Serving stats on http://%s:%s" % (
+        args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+
+
+STORE_FILE_NAME = "changes.sqlite"
+
+
+def _get_submission_timestamp(change):
+    try:
+        approvals = change['currentPatchSet']['approvals']
+    except KeyError:
+        return change['lastUpdated']
+    return next(
+        (approval['grantedOn'] for approval in approvals if
+         approval['type'] == 'SUBM'), change['lastUpdated'])
+
+
+class ChangeStore(object):
+    """Local, indexed store of the changes downloaded from Gerrit.
+
+    Besides changes, store keeps track of the ranges of time it has complete
+    data for. Each such range is kept for the scope (project, branch and
+    status) of the query which was used to fetch data. Scope with empty
+    project or status includes all projects or statuses.
+    Changes are always stored with all patch sets data so any query can be
+    answered from the store.
+    Version of the stored data is kept in the database. If it is different
+    than data_version, all changes are removed and fetched again when
+    needed. Version 0 means complete changes, as returned by Gerrit, which
+    can be used with any data_version.
+    """
+
+    def __init__(self, path, data_version=0):
+        self._connection = sqlite3.connect(path)
+        self._create_schema()
+        self._check_data_version(data_version)
+
+    def _create_schema(self):
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS changes (
+                    id TEXT NOT NULL,
+                    project TEXT NOT NULL,
+                    branch TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_on INTEGER,
+                    last_updated INTEGER NOT NULL,
+                    submitted INTEGER,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (project, branch, id));
+                CREATE INDEX IF NOT EXISTS changes_project
+                    ON changes (project);
+                CREATE INDEX IF NOT EXISTS changes_branch
+                    ON changes (branch);
+                CREATE INDEX IF NOT EXISTS changes_status
+                    ON changes (status);
+                CREATE INDEX IF NOT EXISTS changes_last_updated
+                    ON changes (last_updated);
+                CREATE INDEX IF NOT EXISTS changes_submitted
+                    ON changes (submitted);
+                CREATE TABLE IF NOT EXISTS coverage (
+                    project TEXT NOT NULL,
+                    branch TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    oldest_update INTEGER NOT NULL,
+                    fetched_at INTEGER NOT NULL,
+                    PRIMARY KEY (project, branch, status));
+                """)
+
+    def _check_data_version(self, data_version):
+        (version, ) = self._connection.execute(
+            "PRAGMA user_version").fetchone()
+        if version == data_version:
+            return
+        with self._connection:
+            if version != 0:
+                self._connection.execute("DELETE FROM changes")
+                self._connection.execute("DELETE FROM coverage")
+            # PRAGMA doesn't accept parameters
+            self._connection.execute(
+                "PRAGMA user_version = %d" % data_version)
+
+    def close(self):
+        self._connection.close()
+
+    def _get_project_coverage(self, project, branch, status):
+        return self._connection.execute(
+            "SELECT oldest_update, fetched_at FROM coverage "
+            "WHERE branch = ? AND project IN ('', ?) AND status IN ('', ?) "
+            "ORDER BY oldest_update, fetched_at DESC LIMIT 1",
+            (branch, project, (status or '').upper())).fetchone()
+
+    def get_coverage(self, projects, branch, status):
+        """Get time range for which store has all changes from given scope.
+
+        Returns tuple (oldest_update, fetched_at) - all changes updated after
+        oldest_update timestamp are in the store, as they were at fetched_at
+        time. Ranges stored for wider scopes, like all projects, are taken
+        into account too. None is returned if there is no such range for any
+        of the projects. Empty list of projects means all projects.
+        """
+        oldest_update = fetched_at = None
+        for project in projects or ['']:
+            coverage = self._get_project_coverage(project, branch, status)
+            if coverage is None:
+                return None
+            if oldest_update is None or coverage[0] > oldest_update:
+                oldest_update = coverage[0]
+            if fetched_at is None or coverage[1] < fetched_at:
+                fetched_at = coverage[1]
+        return oldest_update, fetched_at
+
+    def set_coverage(self, projects, branch, status, oldest_update,
+                     fetched_at):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?)",
+                [(project, branch, (status or '').upper(),
+                  oldest_update, fetched_at)
+                 for project in projects or ['']])
+
+    def put_changes(self, changes):
+        rows = [
+            (change['id'], change['project'], change['branch'],
+             change['status'], change.get('createdOn'),
+             change['lastUpdated'], _get_submission_timestamp(change),
+             json.dumps(change))
+            for change in changes]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO changes VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # Don't overwrite changes with older versions of them, e.g. when
+            # the same change was returned by two overlapping queries.
+            self._connection.executemany(
+                "UPDATE changes SET status = ?, created_on = ?, "
+                "last_updated = ?, submitted = ?, data = ? "
+                "WHERE project = ? AND branch = ? AND id = ? AND "
+                "last_updated < ?",
+                [(status, created_on, last_updated, submitted, data,
+                  project, branch, change_id, last_updated)
+                 for (change_id, project, branch, status, created_on,
+                      last_updated, submitted, data) in rows])
+
+    def get_changes(self, projects, branch, status, oldest_update,
+                    all_patch_sets=True):
+        query = ("SELECT data FROM changes "
+                 "WHERE branch = ? AND last_updated >= ?")
+        params = [branch, oldest_update]
+        if projects:
+            query += " AND project IN (%s)" % ', '.join('?' * len(projects))
+            params += projects
+        if status:
+            query += " AND status = ?"
+            params.append(status.upper())
+        query += " ORDER BY created_on"
+        for (data, ) in self._connection.execute(query, params):
+            change = json.loads(data)
+            if not all_patch_sets:
+                change.pop('patchSets', None)
+            yield change
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+
+
+ZUUL_NAME = "Zuul"
+REVIEWERS = ["Alice Developer", "Bob Core", "Carol Reviewer", "Dave Operator",
+             "Eve Contributor"]
+JOBS = ["tempest-full-py3", "neutron-tempest-plugin-scenario-openvswitch",
+        "nova-live-migration", "openstack-tox-py38", "grenade",
+        "tempest-integrated-compute", "devstack-platform-centos-9-stream"]
+BUG_URL = "https://bugs.launchpad.net/%s/+bug/%s"
+ZUUL_FAILED = ("Patch Set %(ps)s: Verified-1\n\nBuild failed (%(pipeline)s "
+               "pipeline).  For information on how to proceed, see "
+               "https://docs.opendev.org/opendev/infra-manual/latest/"
+               "developers.html#automated-testing\n\n"
+               "- %(job)s https://zuul.opendev.org/t/openstack/build/"
+               "%(build)s : FAILURE in 1h 2m 3s")
+ZUUL_SUCCEEDED = ("Patch Set %(ps)s: Verified+%(vote)s\n\nBuild succeeded "
+                  "(%(pipeline)s pipeline).\n\n- %(job)s "
+                  "https://zuul.opendev.org/t/openstack/build/%(build)s : "
+                  "SUCCESS in 45m 12s")
+BARE_RECHECKS = ["Patch Set %(ps)s:\n\nrecheck",
+                 "Patch Set %(ps)s: recheck",
+                 "Patch Set %(ps)s: Code-Review+1\n\nrecheck"]
+RECHECKS_WITH_REASON = [
+    "Patch Set %(ps)s:\n\nrecheck %(job)s failed with timeout",
+    "Patch Set %(ps)s:\n\nrecheck bug %(bug)s",
+    "Patch Set %(ps)s:\n\nrecheck - unrelated failure in %(job)s, "
+    "see %(bug_url)s",
+    "Patch Set %(ps)s: recheck nova-compute failed to start"]
+OTHER_COMMENTS = ["Patch Set %(ps)s: Code-Review+1",
+                  "Patch Set %(ps)s: Code-Review+2",
+                  "Patch Set %(ps)s: Code-Review-1\n\n(3 comments)\n\n"
+                  "Please add unit tests for this.",
+                  "Patch Set %(ps)s:\n\n(1 comment)",
+                  "Uploaded patch set %(ps)s."]
+
+
+class DataGenerator(object):
+    """Generator of the synthetic changes.
+
+    Changes are in the same format as returned by the "gerrit query
+    --format=json --current-patch-set --comments --patch-sets" command, with
+    realistic mix of the Zuul results, rechecks (bare and with reasons) and
+    other review comments.
+
+    :param patch_sets: average number of patch sets of the change
+    :param comments: average number of comments per patch set
+    :param recheck_ratio: probability that Zuul failure is followed by
+                          recheck
+    :param bare_recheck_ratio: probability that recheck is done without
+                               any reason
+    """
+
+    def __init__(self, projects=20, patch_sets=3, comments=4, days=365,
+                 recheck_ratio=0.6, bare_recheck_ratio=0.5,
+                 merged_ratio=0.7, branch='master', seed=None, now=None):
+        self.random = random.Random(seed)
+        self.projects = ['openstack/project-%s' % i for i in range(projects)]
+        self.patch_sets = patch_sets
+        self.comments = comments
+        self.days = days
+        self.recheck_ratio = recheck_ratio
+        self.bare_recheck_ratio = bare_recheck_ratio
+        self.merged_ratio = merged_ratio
+        self.branch = branch
+        self.now = int(now or time.time())
+
+    def _get_comment_params(self, ps_number):
+        bug = self.random.randint(1000000, 2100000)
+        return {'ps': ps_number,
+                'job': self.random.choice(JOBS),
+                'pipeline': self.random.choice(['check', 'check', 'gate']),
+                'build': hashlib.sha1(
+                    str(self.random.random()).encode()).hexdigest()[:32],
+                'vote': self.random.choice([1, 2]),
+                'bug': bug,
+                'bug_url': BUG_URL % ('neutron', bug)}
+
+    def _get_comment(self, reviewer, message, timestamp):
+        return {'timestamp': timestamp,
+                'reviewer': {'name': reviewer,
+                             'username': reviewer.split()[0].lower()},
+                'message': message}
+
+    def _get_ps_comments(self, ps_number, start, end):
+        """Get change comments made for the single patch set."""
+        comments = []
+        number = max(1, int(self.random.expovariate(1.0 / self.comments)))
+        timestamps = sorted(self.random.randint(start, end)
+                            for _ in range(number))
+        for timestamp in timestamps:
+            params = self._get_comment_params(ps_number)
+            if self.random.random() < 0.4:
+                if self.random.random() < 0.5:
+                    comments.append(self._get_comment(
+                        ZUUL_NAME, ZUUL_FAILED % params, timestamp))
+                    if self.random.random() < self.recheck_ratio:
+                        if self.random.random() < self.bare_recheck_ratio:
+                            message = self.random.choice(BARE_RECHECKS)
+                        else:
+                            message = self.random.choice(RECHECKS_WITH_REASON)
+                        comments.append(self._get_comment(
+                            self.random.choice(REVIEWERS), message % params,
+                            timestamp + self.random.randint(60, 7200)))
+                else:
+                    comments.append(self._get_comment(
+                        ZUUL_NAME, ZUUL_SUCCEEDED % params, timestamp))
+            else:
+                comments.append(self._get_comment(
+                    self.random.choice(REVIEWERS),
+                    self.random.choice(OTHER_COMMENTS) % params, timestamp))
+        return comments
+
+    def _get_inline_comments(self, ps_number):
+        return [{'file': 'neutron/agent/l3/agent.py',
+                 'line': self.random.randint(1, 1000),
+                 'reviewer': {'name': self.random.choice(REVIEWERS)},
+                 'message': self.random.choice(
+                     ['nit: typo', 'Why is this needed?', 'Done',
+                      'Please add a test for this'])}
+                for _ in range(self.random.randint(0, 2))]
+
+    def get_change(self, number):
+        patch_sets_number = max(
+            1, int(self.random.expovariate(1.0 / self.patch_sets)))
+        ps_duration = self.random.randint(3600, 5 * 86400)
+        # Last comments (rechecks) can be done up to 2 hours after the end
+        # of the last patch set and nothing can happen in the future
+        created_on = (self.now - patch_sets_number * ps_duration - 7200 -
+                      self.random.randint(0, self.days * 86400))
+        status = 'NEW'
+        if self.random.random() < self.merged_ratio:
+            status = 'MERGED'
+        elif self.random.random() < 0.2:
+            status = 'ABANDONED'
+
+        comments = []
+        patch_sets = []
+        for ps_number in range(1, patch_sets_number + 1):
+            ps_created_on = created_on + (ps_number - 1) * ps_duration
+            comments += self._get_ps_comments(
+                ps_number, ps_created_on, ps_created_on + ps_duration)
+            patch_sets.append({
+                'number': ps_number,
+                'revision': hashlib.sha1(
+                    ('%s-%s' % (number, ps_number)).encode()).hexdigest(),
+                'createdOn': ps_created_on,
+                'uploader': {'name': REVIEWERS[number % len(REVIEWERS)]},
+                'sizeInsertions': self.random.randint(1, 500),
+                'sizeDeletions': -self.random.randint(0, 200),
+                'comments': self._get_inline_comments(ps_number)})
+        last_updated = max(
+            [comment['timestamp'] for comment in comments] +
+            [patch_sets[-1]['createdOn']])
+
+        current_patch_set = dict(patch_sets[-1])
+        current_patch_set.pop('comments')
+        current_patch_set['approvals'] = [
+            {'type': 'Code-Review', 'value': '2',
+             'grantedOn': last_updated - 600,
+             'by': {'name': 'Bob Core'}}]
+        if status == 'MERGED':
+            current_patch_set['approvals'].append(
+                {'type': 'SUBM', 'value': '1', 'grantedOn': last_updated,
+                 'by': {'name': ZUUL_NAME}})
+        change_id = 'I%s' % hashlib.sha1(str(number).encode()).hexdigest()
+        project = self.projects[number % len(self.projects)]
+        return {'project': project,
+                'branch': self.branch,
+                'id': change_id,
+                'number': number,
+                'subject': 'Synthetic change number %s' % number,
+                'owner': {'name': REVIEWERS[number % len(REVIEWERS)]},
+                'url': 'https://review.opendev.org/c/%s/+/%s' % (project,
+                                                                 number),
+                'createdOn': created_on,
+                'lastUpdated': last_updated,
+                'open': status == 'NEW',
+                'status': status,
+                'comments': comments,
+                'patchSets': patch_sets,
+                'currentPatchSet': current_patch_set}
+
+    def get_changes(self, changes):
+        """Get list of changes, the most recently updated first.
+
+        That is the same order as the one used by Gerrit.
+        """
+        data = [self.get_change(number) for number in range(1, changes + 1)]
+        return sorted(data, key=lambda change: change['lastUpdated'],
+                      reverse=True)
+
+    def get_projects_file_data(self, teams=5):
+        """Get data like in the governance projects.yaml for the projects."""
+        projects = {}
+        for i, project in enumerate(self.projects):
+            team = projects.setdefault('team-%s' % (i % teams),
+                                       {'deliverables': {}})
+            team['deliverables'][project.split('/')[1]] = {
+                'repos': [project]}
+        return projects
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic Gerrit data in the JSON Lines '
+                    'format, like "gerrit query --format=json" does.')
+    parser.add_argument('--changes', type=int, default=1000,
+                        help='Number of changes. Default: 1000')
+    parser.add_argument('--projects', type=int, default=20,
+                        help='Number of projects. Default: 20')
+    parser.add_argument('--patch-sets', type=int, default=3,
+                        help='Average number of patch sets per change. '
+                             'Default: 3')
+    parser.add_argument('--comments', type=int, default=4,
+                        help='Average number of comments per patch set. '
+                             'Default: 4')
+    parser.add_argument('--days', type=int, default=365,
+                        help='Changes are created in that many last days. '
+                             'Default: 365')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the random numbers generator.')
+    args = parser.parse_args()
+
+    generator = DataGenerator(projects=args.projects,
+                              patch_sets=args.patch_sets,
+                              comments=args.comments, days=args.days,
+                              seed=args.seed)
+    for change in generator.get_changes(args.changes):
+        sys.stdout.write(json.dumps(change) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from rechecks_stats import gerrit
+
+
+TEAMS_CACHE_FILE_PREFIX = "teams-"
+# Has to be increased every time when the way teams map is built changes
+TEAMS_CACHE_VERSION = 1
+
+# Maps already loaded by the process, by the digest of the projects file
+_REPOS_TO_TEAMS_MAPS = {}
+
+
+def _get_cache_file(digest):
+    cache_dir = "%s/%s" % (Path.home(), gerrit.CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    return "%s/%s%s.json" % (cache_dir, TEAMS_CACHE_FILE_PREFIX, digest)
+
+
+def _parse_projects_file(content):
+    # yaml is needed only with projects file so it is imported only then
+    import yaml
+    # LibYAML based loader is much faster, if it is available
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        projects = yaml.load(content, Loader=loader)
+    except yaml.YAMLError as err:
+        raise ValueError(err)
+    repos_to_teams_map = {}
+    for project_name, project_data in projects.items():
+        for deliverable in project_data.get('deliverables', {}).values():
+            for repo in deliverable.get('repos') or ():
+                repos_to_teams_map[repo] = project_name
+    return repos_to_teams_map
+
+
+def get_repos_to_teams_map(projects_file):
+    """Get map of the repositories to the teams from the projects.yaml file.
+
+    Parsing of the whole governance projects.yaml file is slow so the map
+    built from it is kept in the cache, under the digest of the file
+    content, and parsed again only when the file is changed. Map is also
+    shared by all parsers in the process. ValueError is raised if the file
+    is not valid YAML.
+    """
+    with open(projects_file, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha1(b"%d\n%s" % (TEAMS_CACHE_VERSION,
+                                       content)).hexdigest()
+    if digest in _REPOS_TO_TEAMS_MAPS:
+        return _REPOS_TO_TEAMS_MAPS[digest]
+    cache_file = _get_cache_file(digest)
+    if os.path.exists(cache_file):
+        with open(cache_file) as f:
+            repos_to_teams_map = json.load(f)
+    else:
+        repos_to_teams_map = _parse_projects_file(content)
+        with open("%s.tmp" % cache_file, "w") as f:
+            json.dump(repos_to_teams_map, f, separators=(',', ':'))
+        os.replace("%s.tmp" % cache_file, cache_file)
+    _REPOS_TO_TEAMS_MAPS[digest] = repos_to_teams_map
+    return repos_to_teams_map
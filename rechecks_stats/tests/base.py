@@ -0,0 +1,59 @@
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from rechecks_stats import config
+from rechecks_stats import printer
+
+
+def get_change(number, last_updated, project='openstack/nova',
+               status='MERGED', comments=(), patch_sets=None, **kwargs):
+    """Get change like the ones returned by the "gerrit query" command."""
+    change = {'id': 'I%040d' % number,
+              'number': number,
+              'project': project,
+              'branch': 'master',
+              'status': status,
+              'url': 'https://review.opendev.org/%s' % number,
+              'subject': 'Change %s' % number,
+              'createdOn': last_updated - 86400,
+              'lastUpdated': last_updated,
+              'currentPatchSet': {
+                  'number': 1,
+                  'approvals': [{'type': 'SUBM',
+                                 'grantedOn': last_updated}]},
+              'comments': [{'timestamp': last_updated - 3600,
+                            'reviewer': {'name': 'Zuul'},
+                            'message': message}
+                           for message in comments]}
+    if patch_sets is not None:
+        change['patchSets'] = patch_sets
+    change.update(kwargs)
+    return change
+
+
+class TestCase(unittest.TestCase):
+    """Base class of the tests, with the home (and cache) directory of its
+    own and the printer created for the config of the test.
+    """
+
+    def setUp(self):
+        super(TestCase, self).setUp()
+        home_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(home_dir.cleanup)
+        self.home_dir = home_dir.name
+        self.patch(mock.patch.dict('os.environ', {'HOME': self.home_dir}))
+        # Printer is created only once, with the first config given
+        self.patch(mock.patch.object(printer, 'PRINTER', None))
+
+    def patch(self, patcher):
+        mocked = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mocked
+
+    @staticmethod
+    def get_config(*args):
+        """Get config of the bare-rechecks command run with arguments."""
+        with mock.patch.object(sys, 'argv', ['bare-rechecks'] + list(args)):
+            return config.get_bare_rechecks_parser()
@@ -0,0 +1,251 @@
+import io
+import os
+import sys
+import time
+from unittest import mock
+
+from rechecks_stats import bare_rechecks
+from rechecks_stats import data_parser
+from rechecks_stats import gerrit
+from rechecks_stats.tests import base
+
+
+PROJECTS_FILE = """
+compute:
+  deliverables:
+    nova:
+      repos:
+        - openstack/nova
+    python-novaclient:
+      repos:
+        - openstack/python-novaclient
+networking:
+  deliverables:
+    neutron:
+      repos:
+        - openstack/neutron
+    neutron-lib:
+      repos:
+        - openstack/neutron-lib
+"""
+TEAMS = {'openstack/nova': 'compute',
+         'openstack/python-novaclient': 'compute',
+         'openstack/neutron': 'networking',
+         'openstack/neutron-lib': 'networking'}
+# Project without any rechecks
+NO_RECHECKS_PROJECT = 'openstack/neutron-lib'
+# Project without team in the projects file
+NO_TEAM_PROJECT = 'openstack/orphan'
+PROJECTS = sorted(set(TEAMS) - {NO_RECHECKS_PROJECT}) + [NO_TEAM_PROJECT]
+COMMENTS = ("Patch Set 1: recheck",
+            "Patch Set 1:\n\nrecheck",
+            "Patch Set 2:\n\nrecheck bug 1234567",
+            "Patch Set 2: Code-Review+1",
+            "Patch Set 2: Verified-1\n\nBuild failed (check pipeline).")
+
+
+def _get_percentage(stats):
+    if stats['all_rechecks'] != 0:
+        return (stats['bare_rechecks'] / stats['all_rechecks']) * 100
+    return 0
+
+
+def get_legacy_stats_per_project(points, repos_to_teams_map):
+    """Stats per project computed like BareRechecksDataParser did before."""
+    rechecks_stats = {}
+    for patch_stats in points:
+        project = patch_stats['project']
+        if project not in rechecks_stats:
+            rechecks_stats[project] = {
+                'project': project,
+                'all_rechecks': patch_stats['all_rechecks'],
+                'bare_rechecks': patch_stats['bare_rechecks']}
+        else:
+            rechecks_stats[project]['all_rechecks'] += (
+                patch_stats['all_rechecks'])
+            rechecks_stats[project]['bare_rechecks'] += (
+                patch_stats['bare_rechecks'])
+        if repos_to_teams_map:
+            rechecks_stats[project]['team'] = (
+                repos_to_teams_map.get(project))
+    for stats in rechecks_stats.values():
+        stats['bare_rechecks_percentage'] = _get_percentage(stats)
+    return sorted(rechecks_stats.values(),
+                  key=lambda i: i['bare_rechecks_percentage'], reverse=True)
+
+
+def get_legacy_stats_per_team(points, repos_to_teams_map):
+    """Stats per team computed like BareRechecksDataParser did before."""
+    rechecks_stats = {}
+    for patch_stats in points:
+        team = repos_to_teams_map.get(patch_stats['project'])
+        if not team:
+            continue
+        if team not in rechecks_stats:
+            rechecks_stats[team] = {
+                'team': team,
+                'all_rechecks': patch_stats['all_rechecks'],
+                'bare_rechecks': patch_stats['bare_rechecks']}
+        else:
+            rechecks_stats[team]['all_rechecks'] += (
+                patch_stats['all_rechecks'])
+            rechecks_stats[team]['bare_rechecks'] += (
+                patch_stats['bare_rechecks'])
+    for stats in rechecks_stats.values():
+        stats['bare_rechecks_percentage'] = _get_percentage(stats)
+    return sorted(rechecks_stats.values(),
+                  key=lambda i: i['bare_rechecks_percentage'], reverse=True)
+
+
+class BareRechecksTestCase(base.TestCase):
+
+    def setUp(self):
+        super(BareRechecksTestCase, self).setUp()
+        self.projects_file = os.path.join(self.home_dir, 'projects.yaml')
+        with open(self.projects_file, 'w') as f:
+            f.write(PROJECTS_FILE)
+        now = int(time.time())
+        self.data = []
+        for i in range(40):
+            # Some patches have no rechecks at all, some only bare ones
+            comments = [COMMENTS[(i * j) % len(COMMENTS)]
+                        for j in range(i % 4)]
+            patch_sets = [{'number': 1, 'createdOn': now - 7200,
+                           'comments': [{'message': COMMENTS[i % 2]}]}]
+            self.data.append(base.get_change(
+                i, now - i * 3600, project=PROJECTS[i % len(PROJECTS)],
+                comments=comments, patch_sets=patch_sets[:i % 3]))
+        self.data += [base.get_change(i, now, project=NO_RECHECKS_PROJECT)
+                      for i in range(40, 42)]
+
+
+class TestBareRechecksCube(BareRechecksTestCase):
+
+    def _get_parser(self, *args):
+        config = self.get_config(*args)
+        return data_parser.BareRechecksDataParser(config, self.data)
+
+    @staticmethod
+    def _get_patches(points):
+        return [(point.id, point['all_rechecks'], point['bare_rechecks'])
+                for point in points]
+
+    def _assertSameCube(self, points, repos_to_teams_map, cube):
+        self.assertEqual(self._get_patches(points),
+                         self._get_patches(cube['patch']))
+        self.assertEqual(
+            get_legacy_stats_per_project(points, repos_to_teams_map),
+            cube['project'])
+        self.assertEqual(
+            get_legacy_stats_per_team(points, repos_to_teams_map or {}),
+            cube['team'])
+        global_stats = {
+            'all_rechecks': sum(p['all_rechecks'] for p in points),
+            'bare_rechecks': sum(p['bare_rechecks'] for p in points)}
+        global_stats['bare_rechecks_percentage'] = _get_percentage(
+            global_stats)
+        self.assertEqual([global_stats], cube['global'])
+
+    def test_cube(self):
+        parser = self._get_parser('--projects-file', self.projects_file)
+
+        cube = parser.get_bare_rechecks_cube()
+
+        points = parser._get_points()
+        self.assertEqual(len(self.data), len(points))
+        self.assertGreater(cube['global'][0]['bare_rechecks'], 0)
+        self.assertEqual(
+            {'project': NO_RECHECKS_PROJECT, 'team': 'networking',
+             'all_rechecks': 0, 'bare_rechecks': 0,
+             'bare_rechecks_percentage': 0}, cube['project'][-1])
+        self._assertSameCube(points, TEAMS, cube)
+        self.assertEqual(cube['patch'],
+                         parser.get_bare_rechecks_stats_per_patch())
+        self.assertEqual(cube['project'],
+                         parser.get_bare_rechecks_stats_per_project())
+        self.assertEqual(cube['team'],
+                         parser.get_bare_rechecks_stats_per_team())
+
+    def test_cube_without_projects_file(self):
+        parser = self._get_parser()
+
+        cube = parser.get_bare_rechecks_cube()
+
+        self._assertSameCube(parser._get_points(), None, cube)
+        self.assertEqual([], cube['team'])
+        self.assertNotIn('team', cube['project'][0])
+
+    def test_project_without_team(self):
+        parser = self._get_parser('--projects-file', self.projects_file)
+
+        cube = parser.get_bare_rechecks_cube()
+
+        project_stats = [stats for stats in cube['project']
+                         if stats['project'] == NO_TEAM_PROJECT]
+        self.assertEqual(1, len(project_stats))
+        self.assertIsNone(project_stats[0]['team'])
+        self.assertEqual(['compute', 'networking'],
+                         sorted(stats['team'] for stats in cube['team']))
+        # Patches without team are counted in the global stats
+        self.assertEqual(
+            sum(stats['all_rechecks'] for stats in cube['project']),
+            cube['global'][0]['all_rechecks'])
+        self.assertGreater(
+            cube['global'][0]['all_rechecks'],
+            sum(stats['all_rechecks'] for stats in cube['team']))
+
+    def test_cube_of_team(self):
+        parser = self._get_parser('--projects-file', self.projects_file)
+
+        cube = parser.get_bare_rechecks_cube('compute')
+
+        points = [point for point in parser._get_points()
+                  if TEAMS.get(point['project']) == 'compute']
+        self._assertSameCube(points, TEAMS, cube)
+        self.assertEqual(['openstack/nova', 'openstack/python-novaclient'],
+                         sorted(stats['project']
+                                for stats in cube['project']))
+        self.assertEqual(['compute'],
+                         [stats['team'] for stats in cube['team']])
+        # Cube of all teams is not affected
+        self.assertEqual(len(self.data),
+                         len(parser.get_bare_rechecks_cube()['patch']))
+
+    def test_cube_of_unknown_team(self):
+        parser = self._get_parser('--projects-file', self.projects_file)
+
+        cube = parser.get_bare_rechecks_cube('unknown')
+
+        self.assertEqual([], cube['patch'])
+        self.assertEqual([], cube['project'])
+
+
+class TestBareRechecksCommand(BareRechecksTestCase):
+
+    def _run(self, *args):
+        output = io.StringIO()
+        with mock.patch.object(sys, 'argv', ['bare-rechecks'] + list(args)), \
+                mock.patch.object(sys, 'stdout', output), \
+                mock.patch.object(gerrit.Gerrit, 'iter_json_data',
+                                  return_value=iter(self.data)):
+            bare_rechecks.main()
+        return output.getvalue()
+
+    def test_team(self):
+        output = self._run('--projects-file', self.projects_file,
+                           '--team', 'networking', '--levels', 'project',
+                           '--report-format', 'csv')
+
+        self.assertEqual(['Project', 'Team', 'Bare rechecks', 'All Rechecks',
+                          'Bare rechecks [%]'],
+                         output.splitlines()[0].split(','))
+        self.assertEqual(['openstack/neutron'],
+                         [line.split(',')[0]
+                          for line in output.splitlines()[1:]])
+
+    def test_unknown_team(self):
+        with self.assertRaises(SystemExit) as exit_error:
+            self._run('--projects-file', self.projects_file,
+                      '--team', 'unknown')
+
+        self.assertEqual(1, exit_error.exception.code)
@@ -0,0 +1,179 @@
+import os
+import time
+from unittest import mock
+
+from rechecks_stats import gerrit
+from rechecks_stats.tests import base
+from rechecks_stats import transport
+
+
+PAGE_SIZE = 10
+
+
+class TestPartialResults(base.TestCase):
+
+    def setUp(self):
+        super(TestPartialResults, self).setUp()
+        self.patch(mock.patch.object(gerrit, 'QUERY_RETRY_DELAY', 0))
+        now = int(time.time())
+        # Replay transport returns the most recently updated changes first
+        self.changes = [base.get_change(i, now - 3600 - i * 600)
+                        for i in range(45)]
+
+    def _get_gerrit(self, changes=None, **kwargs):
+        config = self.get_config('--newer-than', '30')
+        replay = transport.ReplayTransport(
+            config, changes=self.changes if changes is None else changes,
+            page_size=PAGE_SIZE, **kwargs)
+        self.patch(mock.patch.object(replay, 'query', wraps=replay.query))
+        with mock.patch.object(transport, 'get_transport',
+                               return_value=replay):
+            return gerrit.Gerrit(config, all_patch_sets=True)
+
+    @staticmethod
+    def _get_starts(_gerrit):
+        return [call[0][1] for call in _gerrit.transport.query.call_args_list]
+
+    def _get_ids(self, changes=None):
+        return sorted(change['id'] for change in changes or self.changes)
+
+    def _write_partial_file(self, _gerrit, pages, tail=b''):
+        _gerrit._ensure_cache_dir_exists()
+        with open(_gerrit._get_partial_file(_gerrit.query), 'a+b') as f:
+            _gerrit._write_partial_header(f, _gerrit.query)
+            for page in pages:
+                for change in page:
+                    _gerrit._write_partial_record(
+                        f, gerrit.project_change(change))
+                _gerrit._write_partial_record(f, {'type': 'checkpoint'})
+            f.write(tail)
+
+    def _load_partial_file(self, _gerrit, query=None):
+        with open(_gerrit._get_partial_file(_gerrit.query), 'a+b') as f:
+            return _gerrit._load_partial_results(f, query or _gerrit.query)
+
+    def test_resume_interrupted_query(self):
+        interrupted = self._get_gerrit()
+        data = interrupted._iter_json_data_from_query(interrupted.query)
+        # Two pages and part of the third one are fetched
+        fetched = [next(data) for _ in range(2 * PAGE_SIZE + 5)]
+        data.close()
+        self.assertEqual(self._get_ids(self.changes[:2 * PAGE_SIZE + 5]),
+                         self._get_ids(fetched))
+
+        # Not fetched yet change is updated, so it moves to the first page
+        # which was fetched already
+        moved = self.changes.pop(30)
+        moved = dict(moved, lastUpdated=int(time.time()), subject='Moved')
+        self.changes.insert(0, moved)
+        resumed = self._get_gerrit()
+        data = list(resumed._iter_json_data_from_query(resumed.query))
+
+        self.assertEqual(2 * PAGE_SIZE, self._get_starts(resumed)[0])
+        self.assertEqual(self._get_ids(), self._get_ids(data))
+        self.assertEqual(len(self.changes), len(data))
+        self.assertIn(gerrit.project_change(moved), data)
+        self.assertFalse(os.path.exists(
+            resumed._get_partial_file(resumed.query)))
+
+    def test_torn_last_line_is_truncated(self):
+        _gerrit = self._get_gerrit()
+        self._write_partial_file(
+            _gerrit, [self.changes[:PAGE_SIZE]],
+            tail=b'{"id": "I%040d", "proj' % PAGE_SIZE)
+        partial_file = _gerrit._get_partial_file(_gerrit.query)
+        size = os.path.getsize(partial_file)
+
+        _created, fetched, changes = self._load_partial_file(_gerrit)
+
+        self.assertEqual(PAGE_SIZE, fetched)
+        self.assertEqual(self._get_ids(self.changes[:PAGE_SIZE]),
+                         self._get_ids(changes))
+        self.assertEqual(size - len(b'{"id": "I%040d", "proj' % PAGE_SIZE),
+                         os.path.getsize(partial_file))
+        data = list(_gerrit._iter_json_data_from_query(_gerrit.query))
+        self.assertEqual(PAGE_SIZE, self._get_starts(_gerrit)[0])
+        self.assertEqual(self._get_ids(), self._get_ids(data))
+
+    def test_uncheckpointed_page_is_dropped(self):
+        _gerrit = self._get_gerrit()
+        self._write_partial_file(_gerrit, [self.changes[:PAGE_SIZE]])
+        with open(_gerrit._get_partial_file(_gerrit.query), 'ab') as f:
+            _gerrit._write_partial_record(
+                f, gerrit.project_change(self.changes[PAGE_SIZE]))
+
+        _created, fetched, changes = self._load_partial_file(_gerrit)
+
+        self.assertEqual(PAGE_SIZE, fetched)
+        self.assertEqual(self._get_ids(self.changes[:PAGE_SIZE]),
+                         self._get_ids(changes))
+
+    def test_patches_deduplicated_across_checkpoints(self):
+        _gerrit = self._get_gerrit()
+        updated = dict(self.changes[0], subject='Updated')
+        self._write_partial_file(
+            _gerrit, [self.changes[:2], [updated, self.changes[2]]])
+
+        _created, fetched, changes = self._load_partial_file(_gerrit)
+
+        # All fetched patches count, so query is resumed from the right page
+        self.assertEqual(4, fetched)
+        self.assertEqual(self._get_ids(self.changes[:3]),
+                         self._get_ids(changes))
+        self.assertIn(gerrit.project_change(updated), changes)
+
+    def test_other_query_partial_results_ignored(self):
+        _gerrit = self._get_gerrit()
+        self._write_partial_file(_gerrit, [self.changes[:PAGE_SIZE]])
+
+        self.assertIsNone(self._load_partial_file(
+            _gerrit, _gerrit.query + ' status:merged'))
+
+    def test_expired_partial_results_ignored(self):
+        _gerrit = self._get_gerrit()
+        self._write_partial_file(_gerrit, [self.changes[:PAGE_SIZE]])
+
+        with mock.patch.object(time, 'time',
+                               return_value=(time.time() +
+                                             gerrit.PARTIAL_MAX_AGE + 1)):
+            self.assertIsNone(self._load_partial_file(_gerrit))
+
+    def test_interrupted_pages_retried(self):
+        _gerrit = self._get_gerrit(error_rate=0.5, seed=1)
+
+        data = list(_gerrit._iter_json_data_from_query(_gerrit.query))
+
+        self.assertGreater(_gerrit.transport.errors, 0)
+        self.assertEqual(self._get_ids(), self._get_ids(data))
+        self.assertEqual(len(self.changes), len(data))
+
+    def test_retries_stop_after_max_query_errors(self):
+        _gerrit = self._get_gerrit(changes=[], error_rate=1)
+
+        with mock.patch.object(time, 'sleep') as sleep:
+            self.assertRaises(SystemExit, list,
+                              _gerrit._iter_json_data_from_query(
+                                  _gerrit.query))
+
+        self.assertEqual(gerrit.MAX_QUERY_ERRORS + 1,
+                         _gerrit.transport.queries)
+        sleep.assert_has_calls([mock.call(0)] * gerrit.MAX_QUERY_ERRORS)
+
+    def test_same_query_run_at_the_same_time(self):
+        first = self._get_gerrit()
+        second = self._get_gerrit()
+        first_data = first._iter_json_data_from_query(first.query)
+        fetched = [next(first_data) for _ in range(PAGE_SIZE + 5)]
+
+        second_data = list(second._iter_json_data_from_query(second.query))
+        fetched += first_data
+
+        self.assertEqual(self._get_ids(), self._get_ids(second_data))
+        self.assertEqual(self._get_ids(), self._get_ids(fetched))
+        self.assertEqual(len(self.changes), len(fetched))
+        # Second query didn't use partial results of the first one
+        self.assertEqual(0, self._get_starts(second)[0])
+        self.assertEqual([0, PAGE_SIZE, 2 * PAGE_SIZE, 3 * PAGE_SIZE,
+                          4 * PAGE_SIZE], self._get_starts(first))
+        self.assertFalse(os.path.exists(
+            first._get_partial_file(first.query)))
@@ -0,0 +1,146 @@
+import random
+import re
+import unittest
+
+from rechecks_stats import matchers
+
+
+# Regular expressions used to match the recheck comments before
+# RecheckMatcher, it has to give the same results
+LEGACY_REGEXES = {
+    matchers.MATCH_ALL: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck",
+        flags=re.IGNORECASE),
+    matchers.MATCH_BARE: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck$",
+        flags=re.IGNORECASE),
+    matchers.MATCH_WITH_REASON: re.compile(
+        r"(?i)^(Patch Set [0-9]+:)?( [\w\\+-]*)*(\n\n)?\s*recheck.+$",
+        flags=re.IGNORECASE),
+}
+
+COMMENTS = [
+    "",
+    "recheck",
+    "RECHECK",
+    "rEcHeCk please",
+    "recheck\n",
+    "recheck\n\n",
+    "recheck \n",
+    "recheck\nreason in the next line",
+    "recheck reason\n",
+    "recheck reason\n\n",
+    "recheckrecheck",
+    "rechec",
+    "Patch Set 1: recheck",
+    "Patch Set 1:recheck",
+    "Patch Set 1:  recheck",
+    "Patch Set 12:\n\nrecheck",
+    "Patch Set 2:\n\n\nrecheck",
+    "Patch Set 2:\n\n \t recheck",
+    "Patch Set 2:\r\n\r\nrecheck",
+    "Patch Set 2:\n\nrecheck\n",
+    "Patch Set 3: Code-Review+1\n\nrecheck",
+    "Patch Set 3: Code-Review+1 Workflow-1\n\nrecheck",
+    "Patch Set 3: Code-Review+1\n\nrecheck bug 1234567",
+    "Patch Set 3: Code-Review+1 recheck",
+    "Patch Set 3: Verified-1\n\nBuild failed, recheck",
+    "Patch Set 3: Code-Review+1\n\nnot a recheck",
+    "Patch Set 3: x\n\nrecheck\nreason",
+    "Patch Set 3: \\ recheck",
+    "Patch Set 3: a\\b recheck",
+    "Patch Set 3: foo.bar recheck",
+    "Patch Set 3: (2 comments)\n\nrecheck",
+    "Patch Set 3: ünïcode wörds\n\nrecheck",
+    "Patch Set 3: ٣\n\nrecheck",
+    "Patch Set 3: recheck",
+    "Patch Set 3: \x1crecheck",
+    "Patch Set 3:\n\n recheck",
+    "Patch Set 3:\n\nrecheck ",
+    "Patch Set 3:\n\nrecheck  ",
+    " recheck",
+    "  recheck",
+    "\nrecheck",
+    "\n\nrecheck",
+    "\trecheck",
+    "foo recheck",
+    " foo recheck",
+    " foo  bar\n\n recheck reason",
+    " foo\nbar recheck",
+    " foo \n recheck",
+    "Patch Set: recheck",
+    "Patch Set x: recheck",
+    "patch set 4: recheck",
+    "PATCH SET 4:\n\nRECHECK",
+    " Patch Set 4: recheck",
+    "Patch Set 4: Patch Set 5: recheck",
+    "Patch Set 4:Patch Set 5: recheck",
+    "Patch Set 4: Workflow+1",
+    "Patch Set 1:\n\n(2 comments)\n\nThanks for the patch, recheck later.",
+]
+
+
+def get_adversarial_comments(size):
+    return [
+        "Patch Set 1:" + " " * size + "!",
+        " " * size + "\t!",
+        " " * size + "recheck",
+        "Patch Set 1:" + "  " * (size // 2) + "recheck\n\nfoo\nbar",
+        "Patch Set 1:" + " word" * (size // 5) + "\n\nnot a recheck!",
+        "Patch Set 1:" + " word" * (size // 5) + "\n\nrecheck",
+        "Patch Set 1:" + " recheck" * (size // 8) + "\n\nlonger\ntext",
+        "Patch Set 1:" + " -+\\" * (size // 4) + " recheck now",
+        "Patch Set 1:" + "\n" * size + "recheck",
+    ]
+
+
+def get_random_comments(number, seed=42):
+    """Get random comments made of the pieces which matter for matching."""
+    pieces = ["Patch Set 1:", "recheck", "RECHECK", "rec", "heck", " ",
+              "  ", "\n", "\n\n", "\t", "\r", "word", "+1", "-", "\\",
+              "!", ":", "é", " "]
+    rand = random.Random(seed)
+    return ["".join(rand.choice(pieces)
+                    for _ in range(rand.randint(0, 8)))
+            for _ in range(number)]
+
+
+class TestRecheckMatcher(unittest.TestCase):
+
+    def assertSameAsRegexes(self, comments):
+        for mode, regex in LEGACY_REGEXES.items():
+            matcher = matchers.RecheckMatcher(mode)
+            for comment in comments:
+                self.assertEqual(
+                    bool(regex.search(comment)), bool(matcher.search(comment)),
+                    "Different result in mode %s for comment %r" % (
+                        mode, comment))
+
+    def test_comments(self):
+        self.assertSameAsRegexes(COMMENTS)
+
+    def test_adversarial_comments(self):
+        self.assertSameAsRegexes(get_adversarial_comments(300))
+
+    def test_random_comments(self):
+        self.assertSameAsRegexes(get_random_comments(20000))
+
+    def test_modes(self):
+        comments = {
+            "Patch Set 1:\n\nrecheck": (True, True, False),
+            "Patch Set 1:\n\nrecheck bug 123": (True, False, True),
+            "Patch Set 1: Workflow+1": (False, False, False),
+        }
+        for comment, expected in comments.items():
+            self.assertEqual(
+                expected,
+                tuple(matchers.RecheckMatcher(mode).search(comment)
+                      for mode in (matchers.MATCH_ALL, matchers.MATCH_BARE,
+                                   matchers.MATCH_WITH_REASON)))
+
+    def test_default_mode(self):
+        self.assertEqual(matchers.MATCH_ALL,
+                         matchers.RecheckMatcher().mode)
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, matchers.RecheckMatcher, "foo")
@@ -0,0 +1,164 @@
+import calendar
+import collections
+import datetime
+import os
+import random
+import time
+import unittest
+
+from rechecks_stats import points_table
+
+
+PROJECTS = ('openstack/nova', 'openstack/neutron', 'openstack/cinder')
+# Time zones with DST, with offsets which are not full hours, with DST
+# shift of 30 minutes, one which skipped the whole day and one which
+# changed offset in the middle of the 15 minutes period
+TIME_ZONES = ('UTC', 'Europe/Berlin', 'America/St_Johns', 'Asia/Kathmandu',
+              'Australia/Lord_Howe', 'Pacific/Apia', 'Pacific/Guam')
+# Moments around which dates are the most likely to be wrong: DST changes,
+# ends of the years with ISO weeks 53, the day skipped in Samoa and the
+# change of the offset in Guam one minute after the 15 minutes period started
+EDGES = ('2020-03-29 01:00', '2020-10-25 01:00', '2020-12-31 12:00',
+         '2021-01-03 12:00', '2021-03-14 05:30', '2021-04-04 15:00',
+         '2021-10-03 15:30', '2011-12-30 10:00', '2015-12-31 23:59',
+         '2027-01-01 00:00', '1969-01-25 13:00')
+
+
+def _get_timestamp(date):
+    return calendar.timegm(time.strptime(date, '%Y-%m-%d %H:%M'))
+
+
+def get_points(seed=42):
+    rand = random.Random(seed)
+    timestamps = []
+    for edge in EDGES:
+        edge = _get_timestamp(edge)
+        # Every 7 minutes and 1 second during two days around the edge
+        timestamps += range(edge - 86400, edge + 86400, 421)
+    # and some points spread over few years
+    timestamps += [rand.randint(_get_timestamp('2019-01-01 00:00'),
+                                _get_timestamp('2023-01-01 00:00'))
+                   for _ in range(5000)]
+    return [{'merged': timestamp,
+             'counter': rand.randint(0, 10),
+             'project': rand.choice(PROJECTS)}
+            for timestamp in timestamps]
+
+
+def _get_legacy_key(point_date, time_window):
+    if time_window == 'day':
+        return str(point_date)
+    if time_window == 'week':
+        point_year, point_week, _ = point_date.isocalendar()
+        return "%s-%s" % (point_year, point_week)
+    if time_window == 'month':
+        return "%s-%s" % (point_date.year, point_date.month)
+    if time_window == 'quarter':
+        return "%s-Q%s" % (point_date.year, (point_date.month - 1) // 3 + 1)
+    return point_date.year
+
+
+def get_legacy_avg(points, time_window):
+    """Averages computed the way AvgDataParser did before PointsTable."""
+    data = collections.defaultdict(list)
+    for point in sorted(points, key=lambda i: i['merged']):
+        point_date = datetime.date.fromtimestamp(point['merged'])
+        data[_get_legacy_key(point_date, time_window)].append(
+            point['counter'])
+    return {k: sum(v) / len(v) for k, v in data.items()}
+
+
+def get_legacy_rolling_avg(points, days, step):
+    """Rolling averages computed day by day from the same local dates."""
+    counters_per_date = collections.defaultdict(list)
+    for point in points:
+        counters_per_date[datetime.date.fromtimestamp(
+            point['merged'])].append(point['counter'])
+    first_day = min(counters_per_date)
+    last_day = max(counters_per_date)
+    rolling_avg = {}
+    while last_day >= first_day:
+        counters = []
+        for i in range(days):
+            counters += counters_per_date.get(
+                last_day - datetime.timedelta(i), [])
+        if counters:
+            rolling_avg[str(last_day)] = sum(counters) / len(counters)
+        last_day -= datetime.timedelta(step)
+    return dict(reversed(rolling_avg.items()))
+
+
+class TestPointsTable(unittest.TestCase):
+
+    def setUp(self):
+        super(TestPointsTable, self).setUp()
+        self.points = get_points()
+        self.addCleanup(self._set_time_zone, os.environ.get('TZ'))
+
+    @staticmethod
+    def _set_time_zone(time_zone):
+        if time_zone is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = time_zone
+        time.tzset()
+
+    def assertAvgEqual(self, expected, avg):
+        # Order matters too, windows are printed in the chronological order
+        self.assertEqual(list(expected), list(avg))
+        for key, value in expected.items():
+            self.assertAlmostEqual(value, avg[key], msg=key)
+
+    def test_get_avg(self):
+        for time_zone in TIME_ZONES:
+            self._set_time_zone(time_zone)
+            table = points_table.PointsTable(self.points)
+            for time_window in points_table.TIME_WINDOWS:
+                with self.subTest(time_zone=time_zone,
+                                  time_window=time_window):
+                    self.assertAvgEqual(
+                        get_legacy_avg(self.points, time_window),
+                        table.get_avg(time_window))
+
+    def test_get_avg_per_project(self):
+        self._set_time_zone('Europe/Berlin')
+        table = points_table.PointsTable(self.points)
+        for project in (PROJECTS[0], PROJECTS[:2], ('openstack/unknown',)):
+            projects = (project,) if isinstance(project, str) else project
+            self.assertAvgEqual(
+                get_legacy_avg([point for point in self.points
+                                if point['project'] in projects], 'week'),
+                table.get_avg('week', project))
+
+    def test_get_rolling_avg(self):
+        points = [point for point in self.points
+                  if point['merged'] < _get_timestamp('2021-06-01 00:00')]
+        for time_zone in ('Europe/Berlin', 'Pacific/Apia'):
+            self._set_time_zone(time_zone)
+            table = points_table.PointsTable(points)
+            for days, step in ((1, 1), (7, 1), (30, 7), (3, 10)):
+                with self.subTest(time_zone=time_zone, days=days,
+                                  step=step):
+                    self.assertAvgEqual(
+                        get_legacy_rolling_avg(points, days, step),
+                        table.get_rolling_avg(days, step))
+
+    def test_get_rolling_avg_per_project(self):
+        self._set_time_zone('Asia/Kathmandu')
+        table = points_table.PointsTable(self.points)
+        points = [point for point in self.points
+                  if point['project'] == PROJECTS[1]]
+        self.assertAvgEqual(get_legacy_rolling_avg(points, 14, 3),
+                            table.get_rolling_avg(14, 3, PROJECTS[1]))
+        self.assertEqual({}, table.get_rolling_avg(14, 3,
+                                                   'openstack/unknown'))
+
+    def test_get_rolling_avg_invalid_window(self):
+        table = points_table.PointsTable(self.points)
+        self.assertRaises(ValueError, table.get_rolling_avg, 0)
+        self.assertRaises(ValueError, table.get_rolling_avg, 7, 0)
+
+    def test_no_points(self):
+        table = points_table.PointsTable([])
+        self.assertEqual({}, table.get_avg('week'))
+        self.assertEqual({}, table.get_rolling_avg(7))
@@ -0,0 +1,114 @@
+import collections
+import random
+import unittest
+
+from rechecks_stats import reasons
+
+
+class TestSpaceSaving(unittest.TestCase):
+
+    @staticmethod
+    def _get_items(number, distinct, seed=42):
+        # Few items are much more frequent than the others, like reasons
+        rand = random.Random(seed)
+        return ['item-%s' % (int(rand.paretovariate(1.2)) % distinct)
+                for _ in range(number)]
+
+    def _get_sketch(self, size, items):
+        sketch = reasons.SpaceSaving(size)
+        for item in items:
+            sketch.add(item)
+            self.assertLessEqual(len(sketch._heap), 2 * size)
+        return sketch
+
+    def test_exact_counts(self):
+        items = self._get_items(5000, 50)
+        counts = collections.Counter(items)
+
+        sketch = self._get_sketch(50, items)
+
+        self.assertEqual(dict(counts), sketch.counts)
+        self.assertEqual(counts.most_common(5), sketch.top(5))
+        self.assertEqual(sorted(counts.values(), reverse=True),
+                         [count for _item, count in sketch.top()])
+
+    def test_overestimate_bound(self):
+        items = self._get_items(20000, 1000)
+        counts = collections.Counter(items)
+        size = 20
+        max_error = len(items) / size
+
+        sketch = self._get_sketch(size, items)
+
+        self.assertGreater(len(counts), size)
+        self.assertEqual(size, len(sketch.counts))
+        self.assertEqual(len(items), sum(sketch.counts.values()))
+        for item, count in sketch.counts.items():
+            self.assertGreaterEqual(count, counts[item])
+            self.assertLessEqual(count, counts[item] + max_error)
+        for item, count in counts.items():
+            if count > max_error:
+                self.assertIn(item, sketch.counts)
+
+    def test_add_with_count(self):
+        sketch = reasons.SpaceSaving(2)
+        sketch.add('a', 5)
+        sketch.add('b', 2)
+        sketch.add('c', 3)
+
+        self.assertEqual({'a': 5, 'c': 5}, sketch.counts)
+
+    def test_heap_rebuilt(self):
+        sketch = reasons.SpaceSaving(3)
+        for _ in range(6):
+            sketch.add('a')
+        self.assertEqual(6, len(sketch._heap))
+
+        sketch.add('a')
+
+        # Outdated pairs are dropped, only current ones are kept
+        self.assertEqual([(7, 'a')], sketch._heap)
+        sketch.add('b')
+        sketch.add('c', 2)
+        sketch.add('d')
+        self.assertEqual({'a': 7, 'c': 2, 'd': 2}, sketch.counts)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, reasons.SpaceSaving, 0)
+
+
+class TestNormalizeReason(unittest.TestCase):
+
+    def assertNormalized(self, expected, msg):
+        self.assertEqual(expected, reasons.normalize_reason(msg))
+
+    def test_patch_set_prefix_and_votes(self):
+        self.assertNormalized(
+            'recheck timeout in the gate',
+            'Patch Set 3: Code-Review+1 Workflow-1\n\n'
+            'recheck  Timeout in\tthe   gate\n')
+        self.assertNormalized('recheck', 'Patch Set 12:\n\nRECHECK')
+
+    def test_launchpad_urls(self):
+        self.assertNormalized(
+            'recheck <bug>',
+            'recheck https://bugs.launchpad.net/neutron/+bug/1234567')
+        self.assertNormalized(
+            'recheck see <bug> and <url>',
+            'recheck see https://launchpad.net/bugs/1234567 and '
+            'http://example.com/logs/job-output.txt')
+
+    def test_bug_numbers(self):
+        for msg in ('recheck LP#1234567', 'recheck lp 1234567',
+                    'recheck bug: 1234567', 'recheck Bug #1234567'):
+            self.assertNormalized('recheck bug <bug>', msg)
+
+    def test_job_names(self):
+        self.assertNormalized(
+            'recheck <job> failed',
+            'recheck neutron-tempest-plugin-scenario-ovn failed')
+        self.assertNormalized(
+            'recheck <job> timed out', 'recheck tempest-full-py3 timed out')
+        # Words joined with single hyphen are not job names
+        self.assertNormalized('recheck nova-compute failed',
+                              'recheck nova-compute failed')
@@ -0,0 +1,213 @@
+import os
+import time
+from unittest import mock
+
+from rechecks_stats import gerrit
+from rechecks_stats import store
+from rechecks_stats.tests import base
+from rechecks_stats import transport
+
+
+PROJECTS = ('openstack/nova', 'openstack/neutron')
+STATUSES = ('MERGED', 'NEW', 'ABANDONED')
+
+
+class TestGerritStore(base.TestCase):
+
+    def setUp(self):
+        super(TestGerritStore, self).setUp()
+        now = int(time.time())
+        # Changes updated every 16 hours during the last 400 days, never
+        # close to the end of the day (since now) used by the age operators
+        self.changes = [
+            base.get_change(
+                i, now - 1800 - i * 57600,
+                project=PROJECTS[i % len(PROJECTS)],
+                status=STATUSES[i % len(STATUSES)],
+                patch_sets=[{'number': 1, 'createdOn': now - i * 57600,
+                             'comments': [{'message': 'recheck'}]}])
+            for i in range(600)]
+
+    def _get_gerrit(self, *args, **kwargs):
+        config = self.get_config('--store', *args)
+        replay = transport.ReplayTransport(config, changes=self.changes)
+        self.patch(mock.patch.object(replay, 'query', wraps=replay.query))
+        with mock.patch.object(transport, 'get_transport',
+                               return_value=replay):
+            return gerrit.Gerrit(config, **kwargs)
+
+    def _get_fetched_data(self, *args, **kwargs):
+        """Get data fetched by the same query, without the store."""
+        _gerrit = self._get_gerrit(*args, **kwargs)
+        _gerrit.config.store = False
+        _gerrit._fetch_patch_sets = _gerrit.all_patch_sets
+        return _gerrit._fetch_json_data()
+
+    @staticmethod
+    def _get_queries(_gerrit):
+        return sorted(set(call[0][0] for call in
+                          _gerrit.transport.query.call_args_list))
+
+    def assertSameData(self, expected, data):
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(sorted(expected, key=lambda c: c['id']),
+                         sorted(data, key=lambda c: c['id']))
+
+    def test_wider_time_range(self):
+        self._get_gerrit('--newer-than', '30').get_json_data()
+        _gerrit = self._get_gerrit('--newer-than', '365')
+
+        data = _gerrit.get_json_data()
+
+        # Only changes updated before the ones already stored are fetched
+        self.assertEqual(['branch:master  -- -age:365d age:30d'],
+                         self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data('--newer-than', '365'),
+                            data)
+
+    def test_narrower_time_range(self):
+        self._get_gerrit('--newer-than', '365').get_json_data()
+        _gerrit = self._get_gerrit('--newer-than', '30')
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual([], self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data('--newer-than', '30'),
+                            data)
+
+    def test_all_time_range(self):
+        self._get_gerrit('--newer-than', '30').get_json_data()
+        _gerrit = self._get_gerrit()
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual(['branch:master  -- age:30d'],
+                         self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data(), data)
+
+    def test_project_from_all_projects(self):
+        self._get_gerrit('--newer-than', '365').get_json_data()
+        args = ('--newer-than', '30', '--project', PROJECTS[1])
+        _gerrit = self._get_gerrit(*args)
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual([], self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data(*args), data)
+
+    def test_all_projects_from_project(self):
+        self._get_gerrit('--newer-than', '30',
+                         '--project', PROJECTS[1]).get_json_data()
+        _gerrit = self._get_gerrit('--newer-than', '30')
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual(['branch:master  -- -age:30d'],
+                         self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data('--newer-than', '30'),
+                            data)
+
+    def test_status_from_all_statuses(self):
+        self._get_gerrit('--newer-than', '60',
+                         all_patch_sets=True).get_json_data()
+        _gerrit = self._get_gerrit('--newer-than', '60', status='merged')
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual([], self._get_queries(_gerrit))
+        self.assertSameData(
+            self._get_fetched_data('--newer-than', '60', status='merged'),
+            data)
+
+    def test_all_statuses_from_status(self):
+        self._get_gerrit('--newer-than', '60',
+                         status='merged').get_json_data()
+        _gerrit = self._get_gerrit('--newer-than', '60', all_patch_sets=True)
+
+        data = _gerrit.get_json_data()
+
+        self.assertEqual(['branch:master  -- -age:60d'],
+                         self._get_queries(_gerrit))
+        self.assertSameData(
+            self._get_fetched_data('--newer-than', '60', all_patch_sets=True),
+            data)
+
+    def test_changed_projection_version(self):
+        self._get_gerrit('--newer-than', '30').get_json_data()
+        with mock.patch.object(gerrit, 'PROJECTION_VERSION',
+                               gerrit.PROJECTION_VERSION + 1):
+            _gerrit = self._get_gerrit('--newer-than', '30')
+            data = _gerrit.get_json_data()
+
+        self.assertEqual(['branch:master  -- -age:30d'],
+                         self._get_queries(_gerrit))
+        self.assertSameData(self._get_fetched_data('--newer-than', '30'),
+                            data)
+
+
+class TestChangeStore(base.TestCase):
+
+    def setUp(self):
+        super(TestChangeStore, self).setUp()
+        self.path = os.path.join(self.home_dir, store.STORE_FILE_NAME)
+        self.changes = [base.get_change(i, 1000 + i) for i in range(3)]
+
+    def _put_changes(self, data_version):
+        change_store = store.ChangeStore(self.path, data_version)
+        change_store.put_changes(self.changes)
+        change_store.set_coverage([], 'master', None, 1000, 2000)
+        change_store.close()
+
+    def _get_store(self, data_version):
+        change_store = store.ChangeStore(self.path, data_version)
+        self.addCleanup(change_store.close)
+        return change_store
+
+    @staticmethod
+    def _get_user_version(change_store):
+        return change_store._connection.execute(
+            "PRAGMA user_version").fetchone()[0]
+
+    def test_same_data_version(self):
+        self._put_changes(1)
+
+        change_store = self._get_store(1)
+
+        self.assertEqual((1000, 2000),
+                         change_store.get_coverage([], 'master', None))
+        self.assertEqual(self.changes, list(change_store.get_changes(
+            [], 'master', None, 0)))
+
+    def test_changed_data_version(self):
+        self._put_changes(1)
+
+        change_store = self._get_store(2)
+
+        self.assertEqual(2, self._get_user_version(change_store))
+        self.assertIsNone(change_store.get_coverage([], 'master', None))
+        self.assertEqual([], list(change_store.get_changes(
+            [], 'master', None, 0)))
+
+    def test_complete_changes_kept(self):
+        self._put_changes(0)
+
+        change_store = self._get_store(1)
+
+        self.assertEqual(1, self._get_user_version(change_store))
+        self.assertEqual((1000, 2000),
+                         change_store.get_coverage([], 'master', None))
+        self.assertEqual(self.changes, list(change_store.get_changes(
+            [], 'master', None, 0)))
+
+    def test_narrowest_coverage_of_projects(self):
+        change_store = self._get_store(1)
+        change_store.set_coverage(['a'], 'master', None, 1000, 3000)
+        change_store.set_coverage(['b'], 'master', 'merged', 500, 2000)
+
+        self.assertEqual((1000, 2000), change_store.get_coverage(
+            ['a', 'b'], 'master', 'merged'))
+        self.assertIsNone(change_store.get_coverage(
+            ['a', 'b'], 'master', None))
+        self.assertIsNone(change_store.get_coverage(
+            ['a', 'c'], 'master', 'merged'))
+        self.assertIsNone(change_store.get_coverage([], 'master', None))
@@ -0,0 +1,418 @@
+import atexit
+import calendar
+import datetime
+import gzip
+import json
+import random
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from rechecks_stats import printer
+
+
+GERRIT_HOST = "review.opendev.org"
+GERRIT_SSH_PORT = 29418
+# How long (in seconds) the shared SSH master connection stays open after
+# the last query finished. It allows to reuse the same authenticated session
+# for all pages of the query, all queries done in the single run and also by
+# the subsequent runs of the script, e.g. from the tools/ scripts.
+SSH_CONTROL_PERSIST = 300
+GERRIT_URL = "https://review.opendev.org"
+# Maximum number of changes returned by Gerrit in the single page
+REST_PAGE_SIZE = 500
+# Maximum number of REST requests (and open connections) at the same time.
+# Next pages of the query are requested before previous ones are received.
+REST_MAX_IN_FLIGHT = 4
+REST_TIMEOUT = 300
+# Prefix added by Gerrit to all JSON responses to prevent XSSI
+REST_MAGIC_PREFIX = ")]}'"
+REST_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+REST_SYSTEM_AUTHOR = "Gerrit Code Review"
+REPLAY_PAGE_SIZE = 500
+REPLAY_SYNTHETIC_CHANGES = 1000
+REPLAY_ERROR = b"Connection to the replay server reset"
+
+_PROJECTS_REGEX = re.compile(r"project:([^\s)'\"]+)")
+_BRANCH_REGEX = re.compile(r"branch:(\S+)")
+_STATUS_REGEX = re.compile(r"status:(\w+)")
+_AGE_REGEX = re.compile(r"(-?)age:(\d+)d")
+_AFTER_REGEX = re.compile(r"after:(\d{4}-\d{2}-\d{2})")
+
+
+def get_transport(config, ssh_control_path):
+    if config.transport == 'replay':
+        return ReplayTransport(config, config.replay_file)
+    if config.transport == 'rest':
+        return RestTransport(config, config.gerrit_url or GERRIT_URL)
+    return SSHTransport(config, ssh_control_path)
+
+
+class Transport(object):
+    """Interface of the transports used to run Gerrit queries.
+
+    Transport runs single query for one page of the results. Paging, handling
+    of the "moreChanges" flag and retries are done by the Gerrit class so
+    they work the same way for every transport.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.printer = printer.get_printer(config)
+
+    def query(self, query, start, all_patch_sets=False):
+        """Yield records of the query output, starting from start.
+
+        Records are in the "gerrit query --format=json --current-patch-set
+        --comments" format, last one is stats of the query. If stats are
+        missing, query was interrupted. Error output (if any) is returned
+        when the output ends.
+        """
+        raise NotImplementedError()
+
+
+class SSHTransport(Transport):
+    """Queries Gerrit with the "gerrit query" command run over SSH."""
+
+    def __init__(self, config, control_path):
+        super(SSHTransport, self).__init__(config)
+        self.control_path = control_path
+
+    def _exec_cmd_stream(self, command):
+        """Run command and yield lines of its output as soon as they arrive.
+
+        Error output of the command is returned when the command finishes.
+        """
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE,
+                stderr=stderr, shell=True)
+            try:
+                with process.stdout:
+                    for line in process.stdout:
+                        yield line
+            except GeneratorExit:
+                # Output is not read till the end, e.g. it is broken
+                process.kill()
+                process.wait()
+                raise
+            process.wait()
+            stderr.seek(0)
+            return stderr.read()
+
+    def _get_ssh_cmd(self):
+        # All ssh processes share single master connection (see
+        # ControlMaster in ssh_config(5)) so TCP and SSH handshakes are done
+        # only once instead of for every page of the results.
+        return (
+            'ssh -o ControlMaster=auto -o ControlPath=%(control_path)s '
+            '-o ControlPersist=%(persist)s -p %(port)s %(host)s ' % {
+                'control_path': self.control_path,
+                'persist': SSH_CONTROL_PERSIST,
+                'port': GERRIT_SSH_PORT,
+                'host': GERRIT_HOST})
+
+    def query(self, query, start, all_patch_sets=False):
+        gerrit_cmd = self._get_ssh_cmd() + (
+            'gerrit query --format=json --current-patch-set --comments ')
+        if all_patch_sets:
+            gerrit_cmd += '--patch-sets '
+        gerrit_cmd += '--start %(start)s %(query)s' % {'start': start,
+                                                       'query': query}
+        output = self._exec_cmd_stream(gerrit_cmd)
+        while True:
+            try:
+                line = next(output)
+            except StopIteration as result:
+                return result.value
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # Connection was broken in the middle of the record, page is
+                # returned as interrupted
+                output.close()
+                return "Interrupted output: %r" % line[:100]
+            yield record
+
+
+class RestTransport(Transport):
+    """Queries Gerrit with the REST API "/changes/" endpoint.
+
+    Requests are sent by the asyncio event loop running in the background
+    thread, through the pool of the keep-alive connections, with gzip
+    compression. When page of the results is requested, next pages of the
+    same query are requested too, so up to REST_MAX_IN_FLIGHT pages are
+    downloaded at the same time.
+    Changes are converted to the format returned by the "gerrit query"
+    command. Comments made for the files (e.g. inline comments) are not
+    returned by the "/changes/" endpoint so patch sets are without them.
+    """
+
+    def __init__(self, config, url=GERRIT_URL, page_size=REST_PAGE_SIZE,
+                 max_in_flight=REST_MAX_IN_FLIGHT):
+        super(RestTransport, self).__init__(config)
+        # asyncio and aiohttp are needed only by this transport and they
+        # take long to import. aiohttp is an optional dependency.
+        import asyncio
+        try:
+            import aiohttp
+        except ImportError:
+            self.printer.log_error(
+                'The "rest" transport requires the aiohttp package. Install '
+                'it with: pip install "rechecks-stats[rest]"')
+            sys.exit(1)
+        self._asyncio = asyncio
+        self._aiohttp = aiohttp
+        self.url = url.rstrip('/')
+        self.page_size = page_size
+        self.max_in_flight = max_in_flight
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self._session = self._run(self._create_session()).result()
+        atexit.register(self.close)
+
+    def _run(self, coroutine):
+        return self._asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _create_session(self):
+        connector = self._aiohttp.TCPConnector(limit=self.max_in_flight)
+        return self._aiohttp.ClientSession(
+            connector=connector,
+            timeout=self._aiohttp.ClientTimeout(total=REST_TIMEOUT),
+            headers={'Accept': 'application/json',
+                     'Accept-Encoding': 'gzip'})
+
+    def close(self):
+        if self._session.closed:
+            return
+        self._run(self._session.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @staticmethod
+    def _get_rest_query(query):
+        # Query is quoted for the shell and "--" separates options of the
+        # "gerrit query" command from the query itself
+        return ' '.join(arg for arg in shlex.split(query) if arg != '--')
+
+    async def _get_page(self, query, start, all_patch_sets):
+        params = [('q', query), ('n', self.page_size), ('S', start),
+                  ('o', 'MESSAGES'), ('o', 'DETAILED_ACCOUNTS'),
+                  ('o', 'ALL_REVISIONS' if all_patch_sets else
+                   'CURRENT_REVISION')]
+        async with self._session.get(
+                '%s/changes/' % self.url, params=params) as response:
+            response.raise_for_status()
+            body = await response.text()
+        if body.startswith(REST_MAGIC_PREFIX):
+            body = body[len(REST_MAGIC_PREFIX):]
+        return json.loads(body)
+
+    def _request_pages(self, query, start, all_patch_sets):
+        """Request page starting from start and next pages of the query."""
+        with self._lock:
+            for i in range(self.max_in_flight):
+                page_start = start + i * self.page_size
+                key = (query, all_patch_sets, page_start)
+                if key not in self._pages:
+                    self._pages[key] = self._run(
+                        self._get_page(query, page_start, all_patch_sets))
+            return self._pages.pop((query, all_patch_sets, start))
+
+    def _drop_pages(self, query, all_patch_sets):
+        """Cancel requests of the pages which will not be needed."""
+        with self._lock:
+            for key in list(self._pages):
+                if key[:2] == (query, all_patch_sets):
+                    self._pages.pop(key).cancel()
+
+    @staticmethod
+    def _get_timestamp(rest_time):
+        # Gerrit returns times in UTC, with nanoseconds
+        return calendar.timegm(time.strptime(rest_time[:19],
+                                             REST_TIME_FORMAT))
+
+    @staticmethod
+    def _get_account(account):
+        account = account or {'name': REST_SYSTEM_AUTHOR}
+        return {'name': account.get('name', ''),
+                'username': account.get('username', '')}
+
+    def _get_patch_set(self, revision, revision_data):
+        return {'number': revision_data['_number'],
+                'revision': revision,
+                'createdOn': self._get_timestamp(revision_data['created']),
+                'uploader': self._get_account(revision_data.get('uploader'))}
+
+    def _get_change(self, change, all_patch_sets):
+        """Convert change to the format returned by "gerrit query"."""
+        revisions = change.get('revisions', {})
+        current_revision = change.get('current_revision')
+        current_patch_set = {'approvals': []}
+        if current_revision in revisions:
+            current_patch_set.update(self._get_patch_set(
+                current_revision, revisions[current_revision]))
+        if change.get('submitted'):
+            current_patch_set['approvals'].append(
+                {'type': 'SUBM', 'value': '1',
+                 'grantedOn': self._get_timestamp(change['submitted']),
+                 'by': self._get_account(change.get('submitter'))})
+        result = {
+            'project': change['project'],
+            'branch': change['branch'],
+            'id': change['change_id'],
+            'number': change['_number'],
+            'subject': change['subject'],
+            'owner': self._get_account(change.get('owner')),
+            'url': '%s/c/%s/+/%s' % (self.url, change['project'],
+                                     change['_number']),
+            'createdOn': self._get_timestamp(change['created']),
+            'lastUpdated': self._get_timestamp(change['updated']),
+            'open': change['status'] == 'NEW',
+            'status': change['status'],
+            'comments': [
+                {'timestamp': self._get_timestamp(message['date']),
+                 'reviewer': self._get_account(message.get('author')),
+                 'message': message['message']}
+                for message in change.get('messages', [])],
+            'currentPatchSet': current_patch_set}
+        if all_patch_sets:
+            result['patchSets'] = sorted(
+                (self._get_patch_set(revision, revision_data)
+                 for revision, revision_data in revisions.items()),
+                key=lambda patch_set: patch_set['number'])
+        return result
+
+    def query(self, query, start, all_patch_sets=False):
+        query = self._get_rest_query(query)
+        page = self._request_pages(query, start, all_patch_sets)
+        try:
+            changes = page.result()
+        except (self._aiohttp.ClientError, self._asyncio.TimeoutError,
+                ValueError) as e:
+            return str(e)
+        more_changes = bool(changes and changes[-1].get('_more_changes'))
+        if not more_changes:
+            self._drop_pages(query, all_patch_sets)
+        elif len(changes) < self.page_size:
+            # Server limits size of the page so next pages were requested
+            # with wrong start.
+            self.page_size = len(changes)
+            self._drop_pages(query, all_patch_sets)
+        for change in changes:
+            yield self._get_change(change, all_patch_sets)
+        yield {'type': 'stats', 'rowCount': len(changes),
+               'moreChanges': more_changes}
+
+
+class ReplayTransport(Transport):
+    """Local stand-in of Gerrit which replays recorded or generated changes.
+
+    Changes are read from the JSON Lines file, e.g. saved output of the
+    "gerrit query --format=json" command or file from the cache (also
+    gzipped). If there is no file, synthetic changes are generated.
+    Queries are answered page by page, like Gerrit does, after configured
+    latency. Page can be interrupted randomly, with given probability, to
+    simulate connection errors.
+
+    Only project, branch, status, age and after operators of the query are
+    taken into account.
+    """
+
+    def __init__(self, config, replay_file=None, changes=None,
+                 page_size=REPLAY_PAGE_SIZE, latency=0, error_rate=0,
+                 seed=None):
+        super(ReplayTransport, self).__init__(config)
+        if changes is None:
+            changes = self._load_changes(replay_file)
+        self.changes = sorted(changes, key=lambda c: c['lastUpdated'],
+                              reverse=True)
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.errors = 0
+
+    def _load_changes(self, replay_file):
+        if not replay_file:
+            # Imported here as it is needed only for that
+            from rechecks_stats import synthetic
+            self.printer.log_debug(
+                "No replay file given, replaying %s synthetic changes" %
+                REPLAY_SYNTHETIC_CHANGES)
+            return synthetic.DataGenerator(seed=0).get_changes(
+                REPLAY_SYNTHETIC_CHANGES)
+        _open = gzip.open if replay_file.endswith('.gz') else open
+        with _open(replay_file, 'rt') as f:
+            records = (json.loads(line) for line in f if line.strip())
+            # Skip stats of the query and header of the cache file
+            return [record for record in records if 'id' in record]
+
+    def _get_filter(self, query):
+        projects = set(_PROJECTS_REGEX.findall(query))
+        branch = _BRANCH_REGEX.search(query)
+        status = _STATUS_REGEX.search(query)
+        now = time.time()
+        newer_than = older_than = None
+        for older, days in _AGE_REGEX.findall(query):
+            if older:
+                newer_than = now - int(days) * 86400
+            else:
+                older_than = now - int(days) * 86400
+        after = _AFTER_REGEX.search(query)
+        if after:
+            after = datetime.datetime.strptime(
+                after.group(1), '%Y-%m-%d').replace(
+                    tzinfo=datetime.timezone.utc).timestamp()
+            newer_than = max(newer_than or after, after)
+
+        def _filter(change):
+            return ((not projects or change['project'] in projects) and
+                    (not branch or change['branch'] == branch.group(1)) and
+                    (not status or
+                     change['status'].lower() == status.group(1).lower()) and
+                    (newer_than is None or
+                     change['lastUpdated'] >= newer_than) and
+                    (older_than is None or
+                     change['lastUpdated'] <= older_than))
+        return _filter
+
+    def _get_interruption(self, page_size):
+        """Get index of the change at which page is interrupted, if any."""
+        with self._lock:
+            self.queries += 1
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return self.random.randint(0, page_size)
+        return None
+
+    @staticmethod
+    def _get_change_data(change, all_patch_sets):
+        if all_patch_sets or 'patchSets' not in change:
+            return change
+        change = dict(change)
+        change.pop('patchSets')
+        return change
+
+    def query(self, query, start, all_patch_sets=False):
+        if self.latency:
+            time.sleep(self.latency)
+        changes = list(filter(self._get_filter(query), self.changes))
+        page = changes[start:start + self.page_size]
+        interrupted_at = self._get_interruption(len(page))
+        for i, change in enumerate(page):
+            if i == interrupted_at:
+                break
+            yield self._get_change_data(change, all_patch_sets)
+        if interrupted_at is not None:
+            return REPLAY_ERROR
+        yield {'type': 'stats', 'rowCount': len(page),
+               'moreChanges': start + len(page) < len(changes)}
+        return b''